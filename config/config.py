@@ -12,29 +12,118 @@ class DatabaseConfig:
     database: str
     host: str
     port: str
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    statement_cache_size: int = 256
+    max_inactive_connection_lifetime: float = 300.0
+    command_timeout: float = 10.0
+    statement_timeout_ms: int = 5000
+    maintenance_timeout: float = 600.0
+    application_name: str = "tandem-todo-bot"
+    completion_history_months: int = 3
 
     @property
     def dsn(self) -> str:
         return f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
+    @property
+    def pool_options(self) -> dict:
+        return {
+            "min_size": self.pool_min_size,
+            "max_size": self.pool_max_size,
+            "statement_cache_size": self.statement_cache_size,
+            "max_inactive_connection_lifetime": self.max_inactive_connection_lifetime,
+            "command_timeout": self.command_timeout,
+            "server_settings": {
+                "application_name": self.application_name,
+                "statement_timeout": str(self.statement_timeout_ms),
+            },
+        }
+
 
 @dataclass
 class BotConfig:
     token: str
     admin_ids: list[int]
+    default_timezone: str = "Europe/Moscow"
+
+
+@dataclass
+class BroadcastConfig:
+    rate: float
+    per_chat_interval: float
+    workers: int
+    progress_interval: float
+
+
+@dataclass
+class WebhookConfig:
+    mode: str
+    host: str
+    port: int
+    path: str
+    secret: str
+    base_url: str
+    max_concurrency: int
+    queue_size: int
+
+    def __post_init__(self):
+        # Without a secret anyone who can reach the port could post updates on behalf of any user
+        if self.enabled and not self.secret:
+            raise ValueError("Для BOT_MODE=webhook обязателен непустой WEBHOOK_SECRET")
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "webhook"
+
+    @property
+    def url(self) -> str:
+        return self.base_url.rstrip("/") + self.path if self.base_url else ""
+
+
+@dataclass
+class FsmConfig:
+    storage: str
+    state_ttl: float
+
+    @property
+    def persistent(self) -> bool:
+        return self.storage == "postgres"
+
+
+@dataclass
+class DiagramConfig:
+    workers: int
+    cache_size: int
+
+
+@dataclass
+class MetricsConfig:
+    host: str
+    port: int
+
+    @property
+    def enabled(self) -> bool:
+        return self.port > 0
 
 
 @dataclass
 class Settings:
     bot: BotConfig
     db: DatabaseConfig
+    broadcast: BroadcastConfig
+    webhook: WebhookConfig
+    fsm: FsmConfig
+    diagram: DiagramConfig
+    metrics: MetricsConfig
 
 
 def load_config() -> Settings:
     return Settings(
         bot=BotConfig(
             token=os.getenv("BOT_TOKEN"),
-            admin_ids=list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
+            admin_ids=list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else [],
+            default_timezone=os.getenv("BOT_TIMEZONE", "Europe/Moscow"),
         ),
 
         db=DatabaseConfig(
@@ -43,5 +132,47 @@ def load_config() -> Settings:
             database=os.getenv("POSTGRES_DB"),
             host=os.getenv("POSTGRES_HOST"),
             port=os.getenv("POSTGRES_PORT"),
+            pool_min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+            pool_max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+            statement_cache_size=int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "256")),
+            max_inactive_connection_lifetime=float(os.getenv("POSTGRES_MAX_INACTIVE_CONNECTION_LIFETIME", "300")),
+            command_timeout=float(os.getenv("POSTGRES_COMMAND_TIMEOUT", "10")),
+            statement_timeout_ms=int(os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", "5000")),
+            maintenance_timeout=float(os.getenv("POSTGRES_MAINTENANCE_TIMEOUT", "600")),
+            application_name=os.getenv("POSTGRES_APPLICATION_NAME", "tandem-todo-bot"),
+            completion_history_months=int(os.getenv("POSTGRES_COMPLETION_HISTORY_MONTHS", "3")),
+        ),
+
+        broadcast=BroadcastConfig(
+            rate=float(os.getenv("BROADCAST_RATE", "28")),
+            per_chat_interval=float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1")),
+            workers=int(os.getenv("BROADCAST_WORKERS", "32")),
+            progress_interval=float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5")),
+        ),
+
+        webhook=WebhookConfig(
+            mode=os.getenv("BOT_MODE", "polling").lower(),
+            host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8080")),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            secret=os.getenv("WEBHOOK_SECRET", ""),
+            base_url=os.getenv("WEBHOOK_BASE_URL", ""),
+            max_concurrency=int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "64")),
+            queue_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+        ),
+
+        fsm=FsmConfig(
+            storage=os.getenv("FSM_STORAGE", "memory").lower(),
+            state_ttl=float(os.getenv("FSM_STATE_TTL", "86400")),
+        ),
+
+        diagram=DiagramConfig(
+            workers=int(os.getenv("DIAGRAM_WORKERS", "2")),
+            cache_size=int(os.getenv("DIAGRAM_CACHE_SIZE", "256")),
+        ),
+
+        metrics=MetricsConfig(
+            host=os.getenv("METRICS_HOST", "127.0.0.1"),
+            port=int(os.getenv("METRICS_PORT", "9108")),
         )
     )
@@ -1,7 +1,9 @@
 from .start import start_router
 from .admin import admin_router
+from .fallback import fallback_router
 
 all_routers = [
     start_router,
-    admin_router
-]
\ No newline at end of file
+    admin_router,
+    fallback_router
+]
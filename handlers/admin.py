@@ -1,18 +1,26 @@
 from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramForbiddenError
 from loguru import logger
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
 from keyboards.admin.inline import (
     get_main_admin_menu, get_tasks_menu, get_task_detail_menu,
     get_pitstop_links_menu, get_link_detail_menu, get_tandems_list_menu,
-    get_schedule_menu, get_tasks_selection_menu
+    get_schedule_menu, get_tasks_selection_menu, get_leaderboard_menu
 )
+from keyboards.callbacks import (
+    ADMIN_BACK, ADMIN_TASKS, ADMIN_LINKS, ADMIN_STATS, ADMIN_SCHEDULE, ADMIN_SCHEDULED_MESSAGES,
+    ADMIN_NOTIFY, ADMIN_TABLE, TASK_ADD, TASK_VIEW, TASK_EDIT, TASK_DELETE, LINK_ADD, LINK_VIEW,
+    LINK_DELETE, TANDEM_STATS, SCHEDULE_CHALLENGE_ADD, TASK_SELECT, TASKS_SELECTED_DONE, TRACKER_SINGLE,
+    TASKS_PAGE, LINKS_PAGE, STATS_PAGE, LEADERBOARD_PAGE
+)
+from keyboards.pagination import parse_page_fields
 from keyboards.start.inline import generate_tracker_single_button
 
+from handlers.dispatch import CallbackTable
+from services.broadcaster import Broadcaster, BroadcastStats, log_progress
 from services.database import AbstractDatabase 
 from services.message_dealer import MessageDealer
 from states.admin import (
@@ -21,23 +29,33 @@ from states.admin import (
 )
 
 admin_router = Router()
+callbacks = CallbackTable(admin_router)
+
+REMINDER_TEXT = "Напоминание: у вас есть невыполненные задачи на сегодня!"
 
 @admin_router.message(F.text.startswith('/admin'))
 async def on_admin_command(message: Message):
     await message.answer("Админ-панель", reply_markup=get_main_admin_menu())
 
-@admin_router.callback_query(F.data == 'admin_back')
+@callbacks(ADMIN_BACK)
 async def on_admin_back(call: CallbackQuery):
     await call.message.edit_text("Админ-панель", reply_markup=get_main_admin_menu())
     await call.answer()
 
-@admin_router.callback_query(F.data == 'admin_tasks')
+@callbacks(ADMIN_TASKS)
 async def on_tasks_menu(call: CallbackQuery, db: AbstractDatabase):
-    tasks = await db.get_all_tasks(active_only=False)
-    await call.message.edit_text("Управление задачами", reply_markup=get_tasks_menu(tasks))
+    page = await db.get_tasks_page()
+    await call.message.edit_text("Управление задачами", reply_markup=get_tasks_menu(page))
     await call.answer()
 
-@admin_router.callback_query(F.data == 'task_add')
+@callbacks(TASKS_PAGE)
+async def on_tasks_page(call: CallbackQuery, fields: Tuple[int, ...], db: AbstractDatabase):
+    backward, cursor = parse_page_fields(fields)
+    page = await db.get_tasks_page(cursor, backward)
+    await call.message.edit_text("Управление задачами", reply_markup=get_tasks_menu(page))
+    await call.answer()
+
+@callbacks(TASK_ADD)
 async def on_task_add_start(call: CallbackQuery, state: FSMContext):
     await call.message.answer("Введите название задачи:")
     await state.set_state(TaskManagement.waiting_for_title)
@@ -68,12 +86,11 @@ async def on_task_points_received(message: Message, state: FSMContext, db: Abstr
     await message.answer(f"✅ Задача создана! ID: {task_id}")
     await state.clear()
     
-    tasks = await db.get_all_tasks(active_only=False)
-    await message.answer("Управление задачами", reply_markup=get_tasks_menu(tasks))
+    page = await db.get_tasks_page()
+    await message.answer("Управление задачами", reply_markup=get_tasks_menu(page))
 
-@admin_router.callback_query(F.data.startswith('task_view_'))
-async def on_task_view(call: CallbackQuery, db: AbstractDatabase):
-    task_id = int(call.data.split('_')[-1])
+@callbacks(TASK_VIEW, 'task_id')
+async def on_task_view(call: CallbackQuery, task_id: int, db: AbstractDatabase):
     task = await db.get_task(task_id)
     if not task:
         await call.answer("Задача не найдена", show_alert=True)
@@ -89,18 +106,16 @@ async def on_task_view(call: CallbackQuery, db: AbstractDatabase):
     await call.message.edit_text(text, reply_markup=get_task_detail_menu(task_id))
     await call.answer()
 
-@admin_router.callback_query(F.data.startswith('task_delete_'))
-async def on_task_delete(call: CallbackQuery, db: AbstractDatabase):
-    task_id = int(call.data.split('_')[-1])
+@callbacks(TASK_DELETE, 'task_id')
+async def on_task_delete(call: CallbackQuery, task_id: int, db: AbstractDatabase):
     await db.delete_task(task_id)
     await call.answer("Задача удалена")
     
-    tasks = await db.get_all_tasks(active_only=False)
-    await call.message.edit_text("Управление задачами", reply_markup=get_tasks_menu(tasks))
+    page = await db.get_tasks_page()
+    await call.message.edit_text("Управление задачами", reply_markup=get_tasks_menu(page))
 
-@admin_router.callback_query(F.data.startswith('task_edit_'))
-async def on_task_edit(call: CallbackQuery, db: AbstractDatabase, state: FSMContext):
-    task_id = int(call.data.split('_')[-1])
+@callbacks(TASK_EDIT, 'task_id')
+async def on_task_edit(call: CallbackQuery, task_id: int, db: AbstractDatabase, state: FSMContext):
     task = await db.get_task(task_id)
     if not task:
         await call.answer("Задача не найдена", show_alert=True)
@@ -133,16 +148,23 @@ async def on_task_edit_received(message: Message, state: FSMContext, db: Abstrac
     await message.answer("✅ Задача обновлена")
     await state.clear()
     
-    tasks = await db.get_all_tasks(active_only=False)
-    await message.answer("Управление задачами", reply_markup=get_tasks_menu(tasks))
+    page = await db.get_tasks_page()
+    await message.answer("Управление задачами", reply_markup=get_tasks_menu(page))
 
-@admin_router.callback_query(F.data == 'admin_links')
+@callbacks(ADMIN_LINKS)
 async def on_links_menu(call: CallbackQuery, db: AbstractDatabase):
-    links = await db.get_pitstop_links(active_only=False)
-    await call.message.edit_text("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(links))
+    page = await db.get_pitstop_links_page()
+    await call.message.edit_text("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(page))
+    await call.answer()
+
+@callbacks(LINKS_PAGE)
+async def on_links_page(call: CallbackQuery, fields: Tuple[int, ...], db: AbstractDatabase):
+    backward, cursor = parse_page_fields(fields)
+    page = await db.get_pitstop_links_page(cursor, backward)
+    await call.message.edit_text("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(page))
     await call.answer()
 
-@admin_router.callback_query(F.data == 'link_add')
+@callbacks(LINK_ADD)
 async def on_link_add_start(call: CallbackQuery, state: FSMContext):
     await call.message.answer("Введите название ссылки:")
     await state.set_state(PitstopManagement.waiting_for_title)
@@ -165,14 +187,12 @@ async def on_link_url_received(message: Message, state: FSMContext, db: Abstract
     await message.answer(f"✅ Ссылка добавлена! ID: {link_id}")
     await state.clear()
     
-    links = await db.get_pitstop_links(active_only=False)
-    await message.answer("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(links))
+    page = await db.get_pitstop_links_page()
+    await message.answer("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(page))
 
-@admin_router.callback_query(F.data.startswith('link_view_'))
-async def on_link_view(call: CallbackQuery, db: AbstractDatabase):
-    link_id = int(call.data.split('_')[-1])
-    links = await db.get_pitstop_links(active_only=False)
-    link = next((l for l in links if l['id'] == link_id), None)
+@callbacks(LINK_VIEW, 'link_id')
+async def on_link_view(call: CallbackQuery, link_id: int, db: AbstractDatabase):
+    link = await db.get_pitstop_link(link_id)
     if not link:
         await call.answer("Ссылка не найдена", show_alert=True)
         return
@@ -181,55 +201,62 @@ async def on_link_view(call: CallbackQuery, db: AbstractDatabase):
     await call.message.edit_text(text, reply_markup=get_link_detail_menu(link_id))
     await call.answer()
 
-@admin_router.callback_query(F.data.startswith('link_delete_'))
-async def on_link_delete(call: CallbackQuery, db: AbstractDatabase):
-    link_id = int(call.data.split('_')[-1])
+@callbacks(LINK_DELETE, 'link_id')
+async def on_link_delete(call: CallbackQuery, link_id: int, db: AbstractDatabase):
     await db.delete_pitstop_link(link_id)
     await call.answer("Ссылка удалена")
     
-    links = await db.get_pitstop_links(active_only=False)
-    await call.message.edit_text("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(links))
+    page = await db.get_pitstop_links_page()
+    await call.message.edit_text("Управление ссылками Питстоп", reply_markup=get_pitstop_links_menu(page))
 
-@admin_router.callback_query(F.data == 'admin_stats')
+@callbacks(ADMIN_STATS)
 async def on_stats_menu(call: CallbackQuery, db: AbstractDatabase):
-    tandems = await db.get_all_tandems_with_summary()
-    await call.message.edit_text("Выберите тандем для просмотра статистики:", reply_markup=get_tandems_list_menu(tandems))
+    page = await db.get_leaderboard_page()
+    await call.message.edit_text("Выберите тандем для просмотра статистики:", reply_markup=get_tandems_list_menu(page))
+    await call.answer()
+
+@callbacks(STATS_PAGE)
+async def on_stats_page(call: CallbackQuery, fields: Tuple[int, ...], db: AbstractDatabase):
+    backward, cursor = parse_page_fields(fields)
+    page = await db.get_leaderboard_page(cursor, backward)
+    await call.message.edit_text("Выберите тандем для просмотра статистики:", reply_markup=get_tandems_list_menu(page))
     await call.answer()
 
-@admin_router.callback_query(F.data.startswith('tandem_stats_'))
-async def on_tandem_stats(call: CallbackQuery, db: AbstractDatabase):
-    tandem_id = int(call.data.split('_')[-1])
+@callbacks(TANDEM_STATS, 'tandem_id')
+async def on_tandem_stats(call: CallbackQuery, tandem_id: int, db: AbstractDatabase):
     stats = await db.get_tandem_statistics(tandem_id, days=7)
-    summary = await db.get_tandem_summary(tandem_id)
+    rank = await db.get_tandem_rank(tandem_id)
     
     text = f"Статистика тандема #{tandem_id}\n\n"
-    text += f"Участники: {', '.join(summary.get('user_names', []))}\n"
+    text += f"Участники: {', '.join(stats['user_names'])}\n"
     text += f"Общий счет: {stats['total_score']} очков\n"
+    if rank:
+        text += f"Место в рейтинге: {rank}\n"
     text += f"Выполнено задач за 7 дней: {stats['tasks_completed']}\n"
     text += f"Выполнения по дням: {len(stats['completions_by_day'])} дней"
     
     await call.message.edit_text(text, reply_markup=get_main_admin_menu())
     await call.answer()
 
-@admin_router.callback_query(F.data == 'admin_schedule')
+@callbacks(ADMIN_SCHEDULE)
 async def on_schedule_menu(call: CallbackQuery):
     await call.message.edit_text("Планирование челленджей", reply_markup=get_schedule_menu())
     await call.answer()
 
-@admin_router.callback_query(F.data == 'schedule_challenge_add')
+@callbacks(SCHEDULE_CHALLENGE_ADD)
 async def on_schedule_challenge_add(call: CallbackQuery, state: FSMContext, db: AbstractDatabase):
+    version = db.catalog_version
     tasks = await db.get_all_tasks(active_only=True)
     if not tasks:
         await call.answer("Нет активных задач. Сначала создайте задачи.", show_alert=True)
         return
     
     await state.update_data(selected_task_ids=[])
-    await call.message.edit_text("Выберите задачи для челленджа:", reply_markup=get_tasks_selection_menu(tasks, []))
+    await call.message.edit_text("Выберите задачи для челленджа:", reply_markup=get_tasks_selection_menu(tasks, [], version))
     await call.answer()
 
-@admin_router.callback_query(F.data.startswith('task_select_'))
-async def on_task_select(call: CallbackQuery, state: FSMContext, db: AbstractDatabase):
-    task_id = int(call.data.split('_')[-1])
+@callbacks(TASK_SELECT, 'task_id')
+async def on_task_select(call: CallbackQuery, task_id: int, state: FSMContext, db: AbstractDatabase):
     data = await state.get_data()
     selected_ids = data.get('selected_task_ids', [])
     
@@ -239,11 +266,12 @@ async def on_task_select(call: CallbackQuery, state: FSMContext, db: AbstractDat
         selected_ids.append(task_id)
     
     await state.update_data(selected_task_ids=selected_ids)
+    version = db.catalog_version
     tasks = await db.get_all_tasks(active_only=True)
-    await call.message.edit_reply_markup(reply_markup=get_tasks_selection_menu(tasks, selected_ids))
+    await call.message.edit_reply_markup(reply_markup=get_tasks_selection_menu(tasks, selected_ids, version))
     await call.answer()
 
-@admin_router.callback_query(F.data == 'tasks_selected_done')
+@callbacks(TASKS_SELECTED_DONE)
 async def on_tasks_selected_done(call: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     selected_ids = data.get('selected_task_ids', [])
@@ -267,7 +295,7 @@ async def on_challenge_message_received(message: Message, state: FSMContext):
     await state.set_state(ScheduleChallenge.waiting_for_send_time)
 
 @admin_router.message(ScheduleChallenge.waiting_for_send_time)
-async def on_challenge_send_time_received(message: Message, state: FSMContext, db: AbstractDatabase, bot: Bot):
+async def on_challenge_send_time_received(message: Message, state: FSMContext, db: AbstractDatabase, bot: Bot, broadcaster: Broadcaster):
     data = await state.get_data()
     selected_ids = data.get('selected_task_ids', [])
     message_text = data.get('message_text')
@@ -286,46 +314,43 @@ async def on_challenge_send_time_received(message: Message, state: FSMContext, d
     
     if send_time <= datetime.now():
         await message.answer("⏰ Время уже наступило, отправляю челлендж...")
-        await send_scheduled_challenges(bot, db)
+        broadcaster.spawn(send_scheduled_challenges(bot, db, broadcaster))
     
     await state.clear()
 
-@admin_router.callback_query(F.data == 'admin_notify')
+@callbacks(ADMIN_NOTIFY)
 async def on_notify_start(call: CallbackQuery, state: FSMContext):
     await call.message.answer("Отправьте сообщение для рассылки (текст или переслать сообщение):")
     await state.set_state(Notify.wait_for_content)
     await call.answer()
 
 @admin_router.message(Notify.wait_for_content)
-async def on_notify_content_received(message: Message, state: FSMContext, bot: Bot, db: AbstractDatabase):
+async def on_notify_content_received(message: Message, state: FSMContext, bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster):
     if message.text == '/stop':
         await message.answer("Рассылка отменена")
         await state.clear()
         return
     
     users = await db.get_all_users()
-    sent = 0
-    failed = 0
-    
-    for user_id in users:
-        try:
-            if hasattr(message, 'forward_from_message_id') and message.forward_from_message_id:
-                await bot.forward_message(user_id, message.chat.id, message.forward_from_message_id)
-            elif message.text:
-                await bot.send_message(user_id, message.text)
-            else:
-                await bot.copy_message(user_id, message.chat.id, message.message_id)
-            sent += 1
-        except TelegramForbiddenError:
-            failed += 1
-        except Exception as e:
-            logger.error(f"Ошибка отправки {user_id}: {e}")
-            failed += 1
-    
-    await message.answer(f"Рассылка завершена. Отправлено: {sent}, Ошибок: {failed}")
+    forward_from_message_id = getattr(message, 'forward_from_message_id', None)
+    status_message = await message.answer(f"Рассылка запущена: 0/{len(users)}")
+
+    async def deliver(user_id: int):
+        if forward_from_message_id:
+            await broadcaster.call(user_id, lambda: bot.forward_message(user_id, message.chat.id, forward_from_message_id))
+        elif message.text:
+            await broadcaster.call(user_id, lambda: bot.send_message(user_id, message.text))
+        else:
+            await broadcaster.call(user_id, lambda: bot.copy_message(user_id, message.chat.id, message.message_id))
+
+    async def report(stats: BroadcastStats):
+        title = "Рассылка завершена" if stats.finished_at else "Рассылка идёт"
+        await status_message.edit_text(f"{title}. {stats.summary()}")
+
+    broadcaster.start('notify', users, deliver, total=len(users), progress=report)
     await state.clear()
 
-@admin_router.callback_query(F.data == 'admin_scheduled_messages')
+@callbacks(ADMIN_SCHEDULED_MESSAGES)
 async def on_scheduled_messages_menu(call: CallbackQuery, state: FSMContext):
     await call.message.answer("Отправьте сообщение для планирования (текст или переслать):")
     await state.set_state(ScheduleMessage.waiting_for_message)
@@ -351,7 +376,7 @@ async def on_scheduled_message_received(message: Message, state: FSMContext):
     await state.set_state(ScheduleMessage.waiting_for_send_time)
 
 @admin_router.message(ScheduleMessage.waiting_for_send_time)
-async def on_scheduled_message_time_received(message: Message, state: FSMContext, db: AbstractDatabase, bot: Bot):
+async def on_scheduled_message_time_received(message: Message, state: FSMContext, db: AbstractDatabase, bot: Bot, broadcaster: Broadcaster):
     data = await state.get_data()
     msg_data = data.get('message_data', {})
     
@@ -376,25 +401,40 @@ async def on_scheduled_message_time_received(message: Message, state: FSMContext
     
     if send_time <= datetime.now():
         await message.answer("⏰ Время уже наступило, отправляю сообщение...")
-        await send_scheduled_messages(bot, db)
+        broadcaster.spawn(send_scheduled_messages(bot, db, broadcaster))
     
     await state.clear()
 
-@admin_router.callback_query(F.data == 'admin_table')
+@callbacks(ADMIN_TABLE)
 async def on_table_receive(call: CallbackQuery, db: AbstractDatabase, md: MessageDealer):
-    tandems = await db.get_all_tandems_with_summary()
+    page = await db.get_leaderboard_page(limit=50)
     
-    if not tandems:
+    if not page['items']:
         await call.message.answer("Нет тандемов")
         await call.answer()
         return
     
+    await call.message.answer(format_leaderboard(page, md), reply_markup=get_leaderboard_menu(page))
+    await call.answer()
+
+@callbacks(LEADERBOARD_PAGE)
+async def on_table_page(call: CallbackQuery, fields: Tuple[int, ...], db: AbstractDatabase, md: MessageDealer):
+    backward, cursor = parse_page_fields(fields)
+    page = await db.get_leaderboard_page(cursor, backward, limit=50)
+    if not page['items']:
+        await call.answer("Больше тандемов нет")
+        return
+    
+    await call.message.edit_text(format_leaderboard(page, md), reply_markup=get_leaderboard_menu(page))
+    await call.answer()
+
+def format_leaderboard(page: Dict, md: MessageDealer) -> str:
     message_lines = [md.get_ui('leaderboard_title')]
     
-    for i, tandem in enumerate(tandems[:50]):
+    for tandem in page['items']:
         users_in_tandem = ", ".join(tandem.get('user_names', []) or [])
         line = md.get_ui('leaderboard_line') % {
-            'rank': i + 1,
+            'rank': tandem['rank'],
             'name': tandem['name'],
             'id': tandem['id'],
             'score': tandem['total_score'],
@@ -402,75 +442,68 @@ async def on_table_receive(call: CallbackQuery, db: AbstractDatabase, md: Messag
         }
         message_lines.append(line)
     
-    await call.message.answer("\n".join(message_lines))
-    await call.answer()
+    return "\n".join(message_lines)
 
-@admin_router.callback_query(F.data.startswith('task_') & F.data.endswith('_single'))
-async def on_task_complete_from_challenge(call: CallbackQuery, db: AbstractDatabase):
-    task_id_str = call.data.replace('_single', '').replace('task_', '')
-    try:
-        task_id = int(task_id_str)
-    except ValueError:
-        await call.answer("Ошибка: неверный ID задачи")
-        return
-    
+@callbacks(TRACKER_SINGLE, 'task_id')
+async def on_task_complete_from_challenge(call: CallbackQuery, task_id: int, db: AbstractDatabase):
     new_status = await db.toggle_task(call.from_user.id, task_id)
     await call.message.edit_reply_markup(reply_markup=None)
     await call.answer(f'✅ Отмечено выполнение задачи')
     logger.info(f'{call.from_user.id} отметил выполнение задачи {task_id} (статус: {new_status})')
 
-async def send_scheduled_challenges(bot: Bot, db: AbstractDatabase):
-    challenges = await db.get_pending_scheduled_challenges()
+async def send_reminders(bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster, timezones: Optional[List[str]] = None) -> Optional[BroadcastStats]:
     tasks = await db.get_all_tasks(active_only=True)
-    task_dict = {task['id']: task for task in tasks}
-    users = await db.get_all_users()
+    if not tasks:
+        return None
     
-    for challenge in challenges:
-        task_ids = challenge['task_ids']
-        message_text = challenge.get('message_text', '')
-        
-        for user_id in users:
-            try:
-                if message_text:
-                    await bot.send_message(user_id, message_text)
-                
-                for task_id in task_ids:
-                    if task_id in task_dict:
-                        task = task_dict[task_id]
-                        keyboard = generate_tracker_single_button(task_id)
-                        await bot.send_message(
-                            user_id,
-                            f"<b>{task['title']}</b>\n{task.get('description', '')}",
-                            reply_markup=keyboard
-                        )
-            except TelegramForbiddenError:
-                pass
-            except Exception as e:
-                logger.error(f"Ошибка отправки челленджа {user_id}: {e}")
+    recipients = db.iter_users_with_incomplete_tasks([task['id'] for task in tasks], timezones)
+
+    async def deliver(user_id: int):
+        await broadcaster.call(user_id, lambda: bot.send_message(user_id, REMINDER_TEXT))
+
+    return await broadcaster.run('reminders', recipients, deliver, progress=log_progress)
+
+async def send_scheduled_challenges(bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster, until: Optional[datetime] = None):
+    while challenges := await db.claim_scheduled_challenges(until):
+        tasks = await db.get_all_tasks(active_only=True)
+        task_dict = {task['id']: task for task in tasks}
         
-        await db.mark_challenge_sent(challenge['id'])
+        for challenge in challenges:
+            message_text = challenge.get('message_text', '')
+            challenge_tasks = [task_dict[task_id] for task_id in challenge['task_ids'] if task_id in task_dict]
 
-async def send_scheduled_messages(bot: Bot, db: AbstractDatabase):
-    messages = await db.get_pending_scheduled_messages()
-    users = await db.get_all_users()
-    
-    for msg in messages:
-        for user_id in users:
-            try:
+            async def deliver(user_id: int):
+                if message_text:
+                    await broadcaster.call(user_id, lambda: bot.send_message(user_id, message_text))
+                for task in challenge_tasks:
+                    await broadcaster.call(user_id, lambda: bot.send_message(
+                        user_id,
+                        f"<b>{task['title']}</b>\n{task.get('description', '')}",
+                        reply_markup=generate_tracker_single_button(task['id'])
+                    ))
+
+            await broadcaster.run_tracked(db, 'challenge', challenge['id'], deliver, progress=log_progress)
+            progress = await db.get_broadcast_progress('challenge', challenge['id'])
+            if not progress.get('pending'):
+                await db.mark_challenge_sent(challenge['id'])
+
+async def send_scheduled_messages(bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster, until: Optional[datetime] = None):
+    while messages := await db.claim_scheduled_messages(until):
+        for msg in messages:
+            async def deliver(user_id: int):
                 if msg['forward_from_message_id'] and msg['target_chat_id']:
-                    await bot.forward_message(
+                    await broadcaster.call(user_id, lambda: bot.forward_message(
                         user_id,
                         msg['target_chat_id'],
                         msg['forward_from_message_id']
-                    )
+                    ))
                 elif msg['text']:
-                    await bot.send_message(user_id, msg['text'])
-            except TelegramForbiddenError:
-                pass
-            except Exception as e:
-                logger.error(f"Ошибка отправки сообщения {user_id}: {e}")
-        
-        await db.mark_message_sent(msg['id'])
+                    await broadcaster.call(user_id, lambda: bot.send_message(user_id, msg['text']))
+
+            await broadcaster.run_tracked(db, 'message', msg['id'], deliver, progress=log_progress)
+            progress = await db.get_broadcast_progress('message', msg['id'])
+            if not progress.get('pending'):
+                await db.mark_message_sent(msg['id'])
 
 @admin_router.message(F.text == '/test_reset')
 async def on_test_reset(message: Message, db: AbstractDatabase):
@@ -478,32 +511,20 @@ async def on_test_reset(message: Message, db: AbstractDatabase):
     await message.answer("✅ Статистика сброшена (тест)")
 
 @admin_router.message(F.text == '/test_challenges')
-async def on_test_challenges(message: Message, bot: Bot, db: AbstractDatabase):
-    await send_scheduled_challenges(bot, db)
+async def on_test_challenges(message: Message, bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster):
+    await send_scheduled_challenges(bot, db, broadcaster)
     await message.answer("✅ Челленджи отправлены (тест)")
 
 @admin_router.message(F.text == '/test_messages')
-async def on_test_messages(message: Message, bot: Bot, db: AbstractDatabase):
-    await send_scheduled_messages(bot, db)
+async def on_test_messages(message: Message, bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster):
+    await send_scheduled_messages(bot, db, broadcaster)
     await message.answer("✅ Сообщения отправлены (тест)")
 
 @admin_router.message(F.text == '/test_reminders')
-async def on_test_reminders(message: Message, bot: Bot, db: AbstractDatabase):
-    tasks = await db.get_all_tasks(active_only=True)
-    if not tasks:
+async def on_test_reminders(message: Message, bot: Bot, db: AbstractDatabase, broadcaster: Broadcaster):
+    stats = await send_reminders(bot, db, broadcaster)
+    if stats is None:
         await message.answer("Нет активных задач")
         return
     
-    task_ids = [task['id'] for task in tasks]
-    users_with_incomplete = await db.get_users_with_incomplete_tasks(task_ids)
-    
-    for user_data in users_with_incomplete:
-        try:
-            await bot.send_message(
-                user_data['user_id'],
-                "Напоминание: у вас есть невыполненные задачи на сегодня!"
-            )
-        except TelegramForbiddenError:
-            pass
-    
-    await message.answer(f"✅ Напоминания отправлены {len(users_with_incomplete)} пользователям (тест)")
+    await message.answer(f"✅ Напоминания отправлены (тест): {stats.summary()}")
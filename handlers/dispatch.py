@@ -0,0 +1,43 @@
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+from keyboards.callbacks import Callback, unpack
+from services.message_dealer import MessageDealer
+
+
+class CallbackTable:
+    def __init__(self, router: Router):
+        self._handlers: Dict[str, Tuple[CallableObject, Tuple[str, ...]]] = {}
+        router.callback_query.register(self._dispatch, self._match)
+
+    def __call__(self, prefix: str, *field_names: str) -> Callable:
+        def register(callback: Callable) -> Callable:
+            if prefix in self._handlers:
+                raise ValueError(f"Префикс {prefix!r} уже зарегистрирован")
+            self._handlers[prefix] = (CallableObject(callback), field_names)
+            return callback
+        return register
+
+    def __contains__(self, prefix: str) -> bool:
+        return prefix in self._handlers
+
+    def resolve(self, prefix: str) -> Optional[Callable]:
+        entry = self._handlers.get(prefix)
+        return entry[0].callback if entry else None
+
+    async def _match(self, call: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+        parsed = unpack(call.data)
+        if parsed is None or parsed[0] not in self._handlers:
+            return False
+        return {'callback': parsed}
+
+    async def _dispatch(self, call: CallbackQuery, callback: Callback, md: MessageDealer, **kwargs: Any) -> Any:
+        prefix, fields = callback
+        handler, field_names = self._handlers[prefix]
+        if len(fields) < len(field_names):
+            return await call.answer(md.get_error('stale_button'))
+        named = dict(zip(field_names, fields))
+        return await handler.call(call, fields=fields, **named, md=md, **kwargs)
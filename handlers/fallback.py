@@ -0,0 +1,15 @@
+from aiogram import Router
+from aiogram.types import CallbackQuery
+from loguru import logger
+
+from services.message_dealer import MessageDealer
+
+# Registered after every other router: catches buttons no table can route, such as the
+# old admin_tasks / task_view_<id> / tpg:... formats still sitting in chats
+fallback_router = Router()
+
+
+@fallback_router.callback_query()
+async def on_stale_callback(call: CallbackQuery, md: MessageDealer):
+    logger.debug(f'{call.from_user.id} нажал устаревшую кнопку: {call.data!r}')
+    await call.answer(md.get_error('stale_button'))
@@ -1,18 +1,23 @@
 from aiogram import Router, F, Bot
 from aiogram.utils.deep_linking import create_start_link
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from loguru import logger
 from typing import List, Dict
 
 from keyboards.start.reply import get_main_menu
 from keyboards.start.inline import create_tandem_button, generate_tracker_keyboard, create_pitstop_keyboard
+from keyboards.callbacks import TANDEM_NAME, TRACKER_CHECK, TRACKER_CLOSE, DELETE_ME
+from handlers.dispatch import CallbackTable
 from services.database import AbstractDatabase
+from services.generate_diagram import DiagramRenderer
 from services.message_dealer import MessageDealer
+from services.timezones import parse_timezone, local_now
 from states import ChooseName
 
 start_router = Router()
+callbacks = CallbackTable(start_router)
 
 
 @start_router.message(CommandStart())
@@ -42,8 +47,8 @@ async def on_command_start(message: Message, bot: Bot, db: AbstractDatabase, sta
                                    reply_markup=create_tandem_button) 
             logger.info(f'{user_id} создал тандем с {refer_user_id}')
 
-    user_info = await db.get_user_info(user_id)
-    if user_info and user_info.get('name') == 'Безымянный пользователь': 
+    session = await db.get_user_session(user_id)
+    if session and session.get('name') == 'Безымянный пользователь': 
         await message.answer(md.get_registration_message('write_your_name'))
         await state.set_state(ChooseName.personal_name)
         logger.info(f'{user_id} перешел в стейт ChooseName.personal_name')
@@ -57,7 +62,7 @@ async def on_command_start(message: Message, bot: Bot, db: AbstractDatabase, sta
         await message.answer(md.get_functional_message('start'), reply_markup=get_main_menu())
 
 
-@start_router.callback_query(F.data == 'type_tandem_name')
+@callbacks(TANDEM_NAME)
 async def on_type_tandem_name(call: CallbackQuery, db: AbstractDatabase, state: FSMContext, md: MessageDealer):
     tandem_info = await db.get_tandem_info(call.from_user.id)
     if not tandem_info:
@@ -101,7 +106,7 @@ async def on_tandem_name_recieved(message: Message, db: AbstractDatabase, state:
 
     await db.set_tandem_name(tandem_info['tandem_id'], tandem_name)
     
-    partner_id = await db.get_partner_id(user_id)
+    partner_id = tandem_info['partner_id']
 
     registration_message = md.get_registration_message("tandem_registered") \
                              % (tandem_info['partner_name'], tandem_name)
@@ -115,42 +120,36 @@ async def on_tandem_name_recieved(message: Message, db: AbstractDatabase, state:
 
 @start_router.message(F.text == '🚴‍♂️ Трекер')
 async def on_text_tracker(message: Message, db: AbstractDatabase, md: MessageDealer):
+    # Read before the tasks: a keyboard built from newer tasks may only land under an older version
+    version = db.catalog_version
     tracker_data: Dict[str, bool] = await db.get_today_stats(message.from_user.id) 
     tasks = await db.get_all_tasks(active_only=True)
 
     await message.answer(md.get_functional_message('tracker'),
-                         reply_markup=generate_tracker_keyboard(tracker_data, tasks))
+                         reply_markup=generate_tracker_keyboard(tracker_data, tasks, version))
     logger.info(f'{message.from_user.id} Нажал на трекер')
 
-@start_router.callback_query(F.data.startswith('task_') & F.data.endswith('_check'))
-async def on_tracker_check(call: CallbackQuery, bot: Bot, db: AbstractDatabase, md: MessageDealer):
-    user_id = call.from_user.id
-    data = call.data
-    
-    if data == 'check_check':
-        await bot.delete_message(call.message.chat.id, call.message.message_id)
-        return
+@callbacks(TRACKER_CLOSE)
+async def on_tracker_close(call: CallbackQuery, bot: Bot):
+    await bot.delete_message(call.message.chat.id, call.message.message_id)
 
-    task_id_str = data.replace('_check', '').replace('task_', '')
-    try:
-        task_id = int(task_id_str)
-    except ValueError:
-        await call.answer("Ошибка: неверный ID задачи")
-        return
 
-    await db.toggle_task(user_id, task_id)
-    
-    tracker_data = await db.get_today_stats(user_id)
+@callbacks(TRACKER_CHECK, 'task_id')
+async def on_tracker_check(call: CallbackQuery, task_id: int, bot: Bot, db: AbstractDatabase, md: MessageDealer):
+    user_id = call.from_user.id
+    version = db.catalog_version
+    _, completed_ids = await db.toggle_task_with_state(user_id, task_id)
     tasks = await db.get_all_tasks(active_only=True)
+    tracker_data = {str(task['id']): task['id'] in completed_ids for task in tasks}
     
     await bot.edit_message_text(md.get_functional_message('tracker'),
                      chat_id=call.message.chat.id, message_id=call.message.message_id,
-                     reply_markup=generate_tracker_keyboard(tracker_data, tasks))
+                     reply_markup=generate_tracker_keyboard(tracker_data, tasks, version))
     await call.answer()
 
 
 @start_router.message(F.text == '🗺 Карта')
-async def on_text_map(message: Message, db: AbstractDatabase, md: MessageDealer):
+async def on_text_map(message: Message, db: AbstractDatabase, md: MessageDealer, diagrams: DiagramRenderer):
     user_id = message.from_user.id
     tandem_info = await db.get_tandem_info(user_id)
     
@@ -180,13 +179,43 @@ async def on_text_map(message: Message, db: AbstractDatabase, md: MessageDealer)
         total_score=total_score
     )
 
-    await message.answer(f"Карта для тандема {tandem_id}:\n" + caption)
+    # The diagram shows today: points the tandem earned today against what today's active tasks allow
+    tasks = await db.get_all_tasks(active_only=True)
+    points = {str(task['id']): task['points'] for task in tasks}
+    max_score = sum(points.values()) * len(summary)
+    if not max_score:
+        return await message.answer(f"Карта для тандема {tandem_id}:\n" + caption)
+
+    today_score = 0
+    for member_id in summary:
+        completed = await db.get_today_stats(member_id)
+        today_score += sum(points.get(task_id, 0) for task_id, done in completed.items() if done)
+
+    diagram = await diagrams.render(today_score, max_score)
+    await message.answer_photo(BufferedInputFile(diagram, filename=f'map_{tandem_id}.png'),
+                               caption=f"Карта для тандема {tandem_id}:\n" + caption)
+
+
+@start_router.message(Command('timezone'))
+async def on_command_timezone(message: Message, command: CommandObject, db: AbstractDatabase, md: MessageDealer):
+    if not command.args:
+        timezone = await db.get_user_timezone(message.from_user.id)
+        return await message.answer(md.get_functional_message('timezone_current') % timezone)
+
+    timezone = parse_timezone(command.args)
+    if timezone is None:
+        return await message.answer(md.get_error('invalid_timezone'))
+
+    await db.set_user_timezone(message.from_user.id, timezone)
+    logger.info(f"Пользователь {message.from_user.id} сменил часовой пояс на {timezone}")
+    await message.answer(md.get_functional_message('timezone_set') % (timezone, local_now(timezone).strftime('%H:%M')))
 
 
 @start_router.message(F.text == '🧭 Питстоп')
 async def on_text_pitstop(message: Message, db: AbstractDatabase, md: MessageDealer):
+    version = db.catalog_version
     links = await db.get_pitstop_links()
-    kb = create_pitstop_keyboard(links)
+    kb = create_pitstop_keyboard(links, version)
     await message.answer(md.get_functional_message('pitstop_menu'), reply_markup=kb)
 
 
@@ -195,7 +224,7 @@ async def on_team_chat(message: Message, md: MessageDealer):
     await message.answer(md.get_functional_message('team_chat'))
 
 
-@start_router.callback_query(F.data =='delete_me')
+@callbacks(DELETE_ME)
 async def on_delete_button_clicked(call: CallbackQuery, db: AbstractDatabase, bot: Bot, md: MessageDealer):
     user_id = call.from_user.id
     
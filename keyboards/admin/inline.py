@@ -1,89 +1,149 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Dict, Optional
+from typing import Callable, Hashable, List, Dict, Optional
+
+from keyboards.callbacks import (
+    pack, ADMIN_BACK, ADMIN_TASKS, ADMIN_LINKS, ADMIN_STATS, ADMIN_SCHEDULE, ADMIN_SCHEDULED_MESSAGES,
+    ADMIN_NOTIFY, ADMIN_TABLE, TASK_ADD, TASK_VIEW, TASK_EDIT, TASK_DELETE, LINK_ADD, LINK_VIEW,
+    LINK_EDIT, LINK_DELETE, TANDEM_STATS, SCHEDULE_CHALLENGE_ADD, SCHEDULE_LIST, SCHEDULE_CHALLENGE_CANCEL,
+    TASK_SELECT, TASKS_SELECTED_DONE, TASKS_PAGE, LINKS_PAGE, STATS_PAGE, LEADERBOARD_PAGE
+)
+from keyboards.pagination import pagination_row
+from services.cache import LRUCache
+
+MENU_CACHE_SIZE = 256
+_menus = LRUCache(maxsize=MENU_CACHE_SIZE)
+
+MAIN_ADMIN_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text='📋 Управление задачами', callback_data=pack(ADMIN_TASKS))],
+    [InlineKeyboardButton(text='📊 Статистика тандемов', callback_data=pack(ADMIN_STATS))],
+    [InlineKeyboardButton(text='🔗 Управление ссылками', callback_data=pack(ADMIN_LINKS))],
+    [InlineKeyboardButton(text='📅 Планирование челленджей', callback_data=pack(ADMIN_SCHEDULE))],
+    [InlineKeyboardButton(text='📨 Запланированные сообщения', callback_data=pack(ADMIN_SCHEDULED_MESSAGES))],
+    [InlineKeyboardButton(text='📤 Рассылка сообщений', callback_data=pack(ADMIN_NOTIFY))],
+    [InlineKeyboardButton(text='🏆 Таблица лидеров', callback_data=pack(ADMIN_TABLE))],
+])
+
+SCHEDULE_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text='➕ Создать челлендж', callback_data=pack(SCHEDULE_CHALLENGE_ADD))],
+    [InlineKeyboardButton(text='📋 Список запланированных', callback_data=pack(SCHEDULE_LIST))],
+    [InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_BACK))],
+])
+
+
+def _cached(key: Optional[Hashable], build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+    # Keys carry the catalog version the data was read under, so edits never hit a stale menu
+    if key is None:
+        return build()
+    menu = _menus.get(key)
+    if menu is None:
+        menu = build()
+        _menus.set(key, menu)
+    return menu
+
+def _page_key(name: str, page: Dict) -> Optional[Hashable]:
+    if page.get('version') is None:
+        return None
+    return name, page['version'], tuple(item['id'] for item in page['items']), page['prev'], page['next']
 
 def get_main_admin_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='📋 Управление задачами', callback_data='admin_tasks')],
-        [InlineKeyboardButton(text='📊 Статистика тандемов', callback_data='admin_stats')],
-        [InlineKeyboardButton(text='🔗 Управление ссылками', callback_data='admin_links')],
-        [InlineKeyboardButton(text='📅 Планирование челленджей', callback_data='admin_schedule')],
-        [InlineKeyboardButton(text='📨 Запланированные сообщения', callback_data='admin_scheduled_messages')],
-        [InlineKeyboardButton(text='📤 Рассылка сообщений', callback_data='admin_notify')],
-        [InlineKeyboardButton(text='🏆 Таблица лидеров', callback_data='admin_table')],
-    ])
+    return MAIN_ADMIN_MENU
+
+def get_tasks_menu(page: Dict) -> InlineKeyboardMarkup:
+    return _cached(_page_key('tasks', page), lambda: _build_tasks_menu(page))
 
-def get_tasks_menu(tasks: List[Dict]) -> InlineKeyboardMarkup:
+def _build_tasks_menu(page: Dict) -> InlineKeyboardMarkup:
     buttons = []
-    for task in tasks:
+    for task in page['items']:
         status = "✅" if task['active'] else "❌"
         buttons.append([
             InlineKeyboardButton(
                 text=f"{status} {task['title']}", 
-                callback_data=f"task_view_{task['id']}"
+                callback_data=pack(TASK_VIEW, task['id'])
             )
         ])
-    buttons.append([InlineKeyboardButton(text='➕ Добавить задачу', callback_data='task_add')])
-    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data='admin_back')])
+    nav = pagination_row(TASKS_PAGE, page)
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton(text='➕ Добавить задачу', callback_data=pack(TASK_ADD))])
+    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_BACK))])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=MENU_CACHE_SIZE)
 def get_task_detail_menu(task_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='✏️ Редактировать', callback_data=f'task_edit_{task_id}')],
-        [InlineKeyboardButton(text='🗑 Удалить', callback_data=f'task_delete_{task_id}')],
-        [InlineKeyboardButton(text='◀️ Назад', callback_data='admin_tasks')],
+        [InlineKeyboardButton(text='✏️ Редактировать', callback_data=pack(TASK_EDIT, task_id))],
+        [InlineKeyboardButton(text='🗑 Удалить', callback_data=pack(TASK_DELETE, task_id))],
+        [InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_TASKS))],
     ])
 
-def get_pitstop_links_menu(links: List[Dict]) -> InlineKeyboardMarkup:
+def get_pitstop_links_menu(page: Dict) -> InlineKeyboardMarkup:
+    return _cached(_page_key('links', page), lambda: _build_pitstop_links_menu(page))
+
+def _build_pitstop_links_menu(page: Dict) -> InlineKeyboardMarkup:
     buttons = []
-    for link in links:
+    for link in page['items']:
         status = "✅" if link['active'] else "❌"
         buttons.append([
             InlineKeyboardButton(
                 text=f"{status} {link['title']}", 
-                callback_data=f"link_view_{link['id']}"
+                callback_data=pack(LINK_VIEW, link['id'])
             )
         ])
-    buttons.append([InlineKeyboardButton(text='➕ Добавить ссылку', callback_data='link_add')])
-    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data='admin_back')])
+    nav = pagination_row(LINKS_PAGE, page)
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton(text='➕ Добавить ссылку', callback_data=pack(LINK_ADD))])
+    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_BACK))])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@lru_cache(maxsize=MENU_CACHE_SIZE)
 def get_link_detail_menu(link_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='✏️ Редактировать', callback_data=f'link_edit_{link_id}')],
-        [InlineKeyboardButton(text='🗑 Удалить', callback_data=f'link_delete_{link_id}')],
-        [InlineKeyboardButton(text='◀️ Назад', callback_data='admin_links')],
+        [InlineKeyboardButton(text='✏️ Редактировать', callback_data=pack(LINK_EDIT, link_id))],
+        [InlineKeyboardButton(text='🗑 Удалить', callback_data=pack(LINK_DELETE, link_id))],
+        [InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_LINKS))],
     ])
 
-def get_tandems_list_menu(tandems: List[Dict]) -> InlineKeyboardMarkup:
+def get_tandems_list_menu(page: Dict) -> InlineKeyboardMarkup:
     buttons = []
-    for tandem in tandems[:20]:
+    for tandem in page['items']:
         buttons.append([
             InlineKeyboardButton(
                 text=f"{tandem['name']} ({tandem['total_score']} очков)", 
-                callback_data=f"tandem_stats_{tandem['id']}"
+                callback_data=pack(TANDEM_STATS, tandem['id'])
             )
         ])
-    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data='admin_back')])
+    nav = pagination_row(STATS_PAGE, page)
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton(text='◀️ Назад', callback_data=pack(ADMIN_BACK))])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_leaderboard_menu(page: Dict) -> Optional[InlineKeyboardMarkup]:
+    nav = pagination_row(LEADERBOARD_PAGE, page)
+    return InlineKeyboardMarkup(inline_keyboard=[nav]) if nav else None
+
 def get_schedule_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text='➕ Создать челлендж', callback_data='schedule_challenge_add')],
-        [InlineKeyboardButton(text='📋 Список запланированных', callback_data='schedule_list')],
-        [InlineKeyboardButton(text='◀️ Назад', callback_data='admin_back')],
-    ])
+    return SCHEDULE_MENU
 
-def get_tasks_selection_menu(tasks: List[Dict], selected_ids: Optional[List[int]] = None) -> InlineKeyboardMarkup:
+def get_tasks_selection_menu(tasks: List[Dict], selected_ids: Optional[List[int]] = None, version: Optional[int] = None) -> InlineKeyboardMarkup:
     selected_ids = selected_ids or []
+    key = None
+    if version is not None:
+        key = 'selection', version, sum(1 << i for i, task in enumerate(tasks) if task['id'] in selected_ids)
+    return _cached(key, lambda: _build_tasks_selection_menu(tasks, selected_ids))
+
+def _build_tasks_selection_menu(tasks: List[Dict], selected_ids: List[int]) -> InlineKeyboardMarkup:
     buttons = []
     for task in tasks:
         marker = "✅" if task['id'] in selected_ids else "☐"
         buttons.append([
             InlineKeyboardButton(
                 text=f"{marker} {task['title']}", 
-                callback_data=f"task_select_{task['id']}"
+                callback_data=pack(TASK_SELECT, task['id'])
             )
         ])
-    buttons.append([InlineKeyboardButton(text='✅ Готово', callback_data='tasks_selected_done')])
-    buttons.append([InlineKeyboardButton(text='◀️ Отмена', callback_data='schedule_challenge_cancel')])
+    buttons.append([InlineKeyboardButton(text='✅ Готово', callback_data=pack(TASKS_SELECTED_DONE))])
+    buttons.append([InlineKeyboardButton(text='◀️ Отмена', callback_data=pack(SCHEDULE_CHALLENGE_CANCEL))])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,101 @@
+import re
+from typing import Dict, Optional, Tuple
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+CALLBACK_LIMIT = 64
+
+# callback_data is one prefix character followed by '.'-separated base36 fields
+TANDEM_NAME = 'n'
+TRACKER_CHECK = 'c'
+TRACKER_CLOSE = 'r'
+TRACKER_SINGLE = 's'
+DELETE_ME = 'x'
+
+ADMIN_BACK = 'B'
+ADMIN_TASKS = 'T'
+ADMIN_LINKS = 'L'
+ADMIN_STATS = 'S'
+ADMIN_SCHEDULE = 'C'
+ADMIN_SCHEDULED_MESSAGES = 'M'
+ADMIN_NOTIFY = 'N'
+ADMIN_TABLE = 'R'
+
+TASK_ADD = 'a'
+TASK_VIEW = 'v'
+TASK_EDIT = 'e'
+TASK_DELETE = 'd'
+LINK_ADD = 'A'
+LINK_VIEW = 'V'
+LINK_EDIT = 'E'
+LINK_DELETE = 'D'
+TANDEM_STATS = 'h'
+
+SCHEDULE_CHALLENGE_ADD = 'k'
+SCHEDULE_LIST = 'l'
+SCHEDULE_CHALLENGE_CANCEL = 'q'
+TASK_SELECT = 'p'
+TASKS_SELECTED_DONE = 'o'
+
+TASKS_PAGE = '1'
+LINKS_PAGE = '2'
+STATS_PAGE = '3'
+LEADERBOARD_PAGE = '4'
+
+Callback = Tuple[str, Tuple[int, ...]]
+
+# Buttons already sitting in users' chats still carry the old string format
+_LEGACY: Dict[str, Callback] = {
+    'type_tandem_name': (TANDEM_NAME, ()),
+    'check_check': (TRACKER_CLOSE, ()),
+    'delete_me': (DELETE_ME, ()),
+}
+_LEGACY_TASK = re.compile(r'^task_(\d+)_(check|single)$')
+
+
+def _to_base36(value: int) -> str:
+    if value < 0:
+        return '-' + _to_base36(-value)
+    encoded = ''
+    while True:
+        value, digit = divmod(value, 36)
+        encoded = DIGITS[digit] + encoded
+        if not value:
+            return encoded
+
+
+def encode_fields(fields: Tuple[int, ...]) -> str:
+    return '.'.join(_to_base36(value) for value in fields)
+
+
+def decode_fields(data: str) -> Tuple[int, ...]:
+    if not data:
+        return ()
+    return tuple(int(part, 36) for part in data.split('.'))
+
+
+def pack(prefix: str, *fields: int) -> str:
+    data = prefix + encode_fields(fields)
+    if len(data.encode()) > CALLBACK_LIMIT:
+        raise ValueError(f"callback_data длиннее {CALLBACK_LIMIT} байт: {data}")
+    return data
+
+
+def _unpack_legacy(data: str) -> Optional[Callback]:
+    legacy = _LEGACY.get(data)
+    if legacy:
+        return legacy
+    match = _LEGACY_TASK.match(data)
+    if match:
+        return (TRACKER_CHECK if match.group(2) == 'check' else TRACKER_SINGLE), (int(match.group(1)),)
+    return None
+
+
+def unpack(data: Optional[str]) -> Optional[Callback]:
+    if not data:
+        return None
+    if '_' in data:
+        return _unpack_legacy(data)
+    try:
+        return data[0], decode_fields(data[1:])
+    except ValueError:
+        return None
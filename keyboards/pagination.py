@@ -0,0 +1,21 @@
+from aiogram.types import InlineKeyboardButton
+from typing import Dict, List, Optional, Tuple
+
+from keyboards.callbacks import pack
+
+
+def page_callback(prefix: str, backward: bool, cursor: Tuple[int, ...]) -> str:
+    return pack(prefix, int(backward), *cursor)
+
+
+def parse_page_fields(fields: Tuple[int, ...]) -> Tuple[bool, Optional[Tuple[int, ...]]]:
+    return bool(fields and fields[0]), fields[1:] or None
+
+
+def pagination_row(prefix: str, page: Dict) -> List[InlineKeyboardButton]:
+    row = []
+    if page['prev']:
+        row.append(InlineKeyboardButton(text='⬅️', callback_data=page_callback(prefix, True, page['prev'])))
+    if page['next']:
+        row.append(InlineKeyboardButton(text='➡️', callback_data=page_callback(prefix, False, page['next'])))
+    return row
@@ -1,20 +1,41 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List
+from typing import List, Optional
+from keyboards.callbacks import pack, TANDEM_NAME, TRACKER_CHECK, TRACKER_CLOSE, TRACKER_SINGLE
+from services.cache import LRUCache
 from services.message_dealer import MessageDealer
 
+# Tracker keyboards differ only by which of the catalog's tasks are done today,
+# so (catalog version, completion bitmask) identifies one fully
+KEYBOARD_CACHE_SIZE = 512
+_keyboards = LRUCache(maxsize=KEYBOARD_CACHE_SIZE)
+
 create_tandem_button = InlineKeyboardMarkup(inline_keyboard=[
-    [InlineKeyboardButton(text='Назвать тандем', callback_data='type_tandem_name')]
+    [InlineKeyboardButton(text='Назвать тандем', callback_data=pack(TANDEM_NAME))]
 ])
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def generate_tracker_single_button(task_id: int):
-    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Готово ✅', callback_data=f'task_{task_id}_single')]])
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Готово ✅', callback_data=pack(TRACKER_SINGLE, task_id))]])
 
 
-def generate_tracker_keyboard(scores=None, tasks=None):
+def generate_tracker_keyboard(scores=None, tasks=None, version: Optional[int] = None):
     scores = scores or {}
     tasks = tasks or []
-    
+
+    if version is not None:
+        mask = sum(1 << i for i, task in enumerate(tasks) if scores.get(str(task['id'])))
+        key = ('tracker', version, mask)
+        keyboard = _keyboards.get(key)
+        if keyboard is None:
+            keyboard = _build_tracker_keyboard(scores, tasks)
+            _keyboards.set(key, keyboard)
+        return keyboard
+    return _build_tracker_keyboard(scores, tasks)
+
+
+def _build_tracker_keyboard(scores: dict, tasks: List[dict]) -> InlineKeyboardMarkup:
     keyboard_buttons = []
 
     for task in tasks:
@@ -23,14 +44,21 @@ def generate_tracker_keyboard(scores=None, tasks=None):
         check_symbol = '✅' if scores.get(task_id) else ' '
         keyboard_buttons.append([InlineKeyboardButton(
             text=f'[{check_symbol}] {title}', 
-            callback_data=f'task_{task_id}_check'
+            callback_data=pack(TRACKER_CHECK, task['id'])
         )])
 
-    keyboard_buttons.append([InlineKeyboardButton(text='Обновить', callback_data='check_check')])
+    keyboard_buttons.append([InlineKeyboardButton(text='Обновить', callback_data=pack(TRACKER_CLOSE))])
     return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
 
-def create_pitstop_keyboard(links: List[dict]) -> InlineKeyboardMarkup:
+def create_pitstop_keyboard(links: List[dict], version: Optional[int] = None) -> InlineKeyboardMarkup:
+    if version is not None:
+        keyboard = _keyboards.get(('pitstop', version))
+        if keyboard is None:
+            keyboard = create_pitstop_keyboard(links)
+            _keyboards.set(('pitstop', version), keyboard)
+        return keyboard
+
     buttons = []
     for link in links:
         buttons.append([InlineKeyboardButton(text=link['title'], url=link['url'])])
@@ -1,18 +1,25 @@
 import asyncio
 import sys
+from typing import Optional
 from loguru import logger
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import load_config
+from config.config import Settings
 from handlers import all_routers
-from services import PostgresService, MessageDealer
-from services.scheduler import setup_scheduler
-from middlewares import AdminMiddleware
+from services import PostgresService, MessageDealer, Broadcaster
+from services.scheduler import setup_scheduler, setup_schedule_triggers
+from services.webhook import run_webhook
+from services.fsm_storage import PostgresStorage, UpdateCacheIsolation
+from services.generate_diagram import DiagramRenderer
+from services.metrics import MetricsServer
+from middlewares import AdminMiddleware, MetricsMiddleware, HandlerNameMiddleware, register_outermost
 from handlers.admin import admin_router
 
 def setup_logging():
@@ -20,20 +27,46 @@ def setup_logging():
     logger.add(sys.stdout, level="INFO", format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <cyan>{message}</cyan>")
     logger.add("logs/bot.log", rotation="5 MB", compression="zip", level="DEBUG")
 
-async def main():
-    setup_logging()
-
-    config = load_config()
+def create_bot(config: Settings, session: Optional[BaseSession] = None) -> Bot:
+    return Bot(
+        token=config.bot.token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
 
-    db_service = PostgresService(dsn=config.db.dsn)
+def create_dispatcher(config: Settings, bot: Bot) -> Dispatcher:
+    db_service = PostgresService(
+        dsn=config.db.dsn,
+        pool_options=config.db.pool_options,
+        completion_history_months=config.db.completion_history_months,
+        maintenance_timeout=config.db.maintenance_timeout,
+        default_timezone=config.bot.default_timezone
+    )
     md = MessageDealer()
+    broadcaster = Broadcaster(
+        rate=config.broadcast.rate,
+        per_chat_interval=config.broadcast.per_chat_interval,
+        workers=config.broadcast.workers,
+        progress_interval=config.broadcast.progress_interval,
+    )
+    diagrams = DiagramRenderer(workers=config.diagram.workers, cache_size=config.diagram.cache_size)
 
-    bot = Bot(
-        token=config.bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    fsm_storage = PostgresStorage(db_service, state_ttl=config.fsm.state_ttl) if config.fsm.persistent else None
+    storage = fsm_storage or MemoryStorage()
+    dp = Dispatcher(
+        storage=storage,
+        events_isolation=UpdateCacheIsolation(fsm_storage) if fsm_storage else None,
+        db=db_service,
+        config=config,
+        md=md,
+        broadcaster=broadcaster,
+        diagrams=diagrams
     )
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+
+    register_outermost(dp.update.outer_middleware, MetricsMiddleware())
+    handler_names = HandlerNameMiddleware()
+    dp.message.middleware(handler_names)
+    dp.callback_query.middleware(handler_names)
 
     admin_middleware = AdminMiddleware()
     admin_router.message.middleware(admin_middleware)
@@ -42,14 +75,20 @@ async def main():
     for router in all_routers:
         dp.include_router(router)
 
-    scheduler = AsyncIOScheduler()
+    scheduler = AsyncIOScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+    metrics_server = MetricsServer(config.metrics.host, config.metrics.port) if config.metrics.enabled else None
 
     @dp.startup()
     async def on_startup():
+        if metrics_server:
+            await metrics_server.start()
+        await db_service.migrate()
         await db_service.connect()
-        await db_service.create_default_tables()
-        setup_scheduler(scheduler, bot, db_service)
+        await db_service.load_known_users()
+        diagrams.start()
+        setup_scheduler(scheduler, bot, db_service, broadcaster, fsm_storage)
         scheduler.start()
+        await setup_schedule_triggers(scheduler, bot, db_service, broadcaster)
         logger.info("Планировщик задач запущен")
         logger.info("Бот запущен успешно")
 
@@ -57,14 +96,26 @@ async def main():
     async def on_shutdown():
         scheduler.shutdown()
         logger.info("Планировщик задач остановлен")
+        diagrams.close()
+        if metrics_server:
+            await metrics_server.close()
+        await db_service.disconnect()
         logger.info("Бот остановлен")
 
-    await dp.start_polling(
-        bot,
-        db_service=db_service,
-        config=config,
-        md=md
-    )
+    return dp
+
+async def main():
+    setup_logging()
+
+    config = load_config()
+    bot = create_bot(config)
+    dp = create_dispatcher(config, bot)
+
+    if config.webhook.enabled:
+        await run_webhook(dp, bot, config.webhook)
+    else:
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 if __name__ == '__main__':
     try:
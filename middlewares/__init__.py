@@ -1,4 +1,4 @@
 from .admin import AdminMiddleware
+from .metrics import MetricsMiddleware, HandlerNameMiddleware, register_outermost
 
-__all__ = ['AdminMiddleware']
-
+__all__ = ['AdminMiddleware', 'MetricsMiddleware', 'HandlerNameMiddleware', 'register_outermost']
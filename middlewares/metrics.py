@@ -0,0 +1,62 @@
+import time
+from typing import Callable, Dict, Any, Awaitable, List
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.middlewares.manager import MiddlewareManager
+from aiogram.types import TelegramObject
+
+from handlers.dispatch import CallbackTable
+from services.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+UNHANDLED = 'unhandled'
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    callback = data['handler'].callback
+    table = getattr(callback, '__self__', None)
+    if isinstance(table, CallbackTable) and 'callback' in data:
+        callback = table.resolve(data['callback'][0]) or callback
+    return getattr(callback, '__name__', UNHANDLED)
+
+
+def register_outermost(manager: MiddlewareManager, middleware: BaseMiddleware):
+    # The Dispatcher registers its own errors, user context and FSM middlewares on init;
+    # re-register them after ours so the FSM storage round trip is part of the measured time
+    defaults = list(manager)
+    for registered in defaults:
+        manager.unregister(registered)
+    manager.register(middleware)
+    for registered in defaults:
+        manager.register(registered)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    # Outermost middleware on dp.update: times the whole update, the inner HandlerNameMiddleware fills in the label
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        route: List[str] = [UNHANDLED]
+        data['metrics_route'] = route
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.labels(route[0], type(e).__name__).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(route[0]).observe(time.perf_counter() - started)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        route = data.get('metrics_route')
+        if route is not None:
+            route[0] = handler_name(data)
+        return await handler(event, data)
@@ -0,0 +1,169 @@
+-- Baseline schema. Databases created before migrations existed already have most of it,
+-- so every statement here is idempotent and brings such a database up to date.
+
+CREATE TABLE IF NOT EXISTS tandems (
+    id SERIAL PRIMARY KEY,
+    name TEXT DEFAULT 'Тандем',
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    name TEXT DEFAULT 'Безымянный пользователь',
+    tandem_id INTEGER REFERENCES tandems(id) ON DELETE SET NULL,
+    score INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone TEXT;
+
+CREATE TABLE IF NOT EXISTS tandem_scores (
+    tandem_id INTEGER PRIMARY KEY REFERENCES tandems(id) ON DELETE CASCADE,
+    score INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    last_updated DATE DEFAULT CURRENT_DATE
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    points INTEGER DEFAULT 1,
+    active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- task_completions used to be a plain table; its rows are carried over into the
+-- partitioned one and land in the default partition until monthly partitions take them
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('task_completions')) = 'r' THEN
+        CREATE TEMP TABLE legacy_completions ON COMMIT DROP AS
+        SELECT DISTINCT user_id, task_id, completed_date FROM task_completions;
+        DROP TABLE task_completions;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS task_completions (
+    user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    completed_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (user_id, completed_date, task_id)
+) PARTITION BY RANGE (completed_date);
+
+CREATE TABLE IF NOT EXISTS task_completions_default PARTITION OF task_completions DEFAULT;
+
+DO $$
+BEGIN
+    IF to_regclass('pg_temp.legacy_completions') IS NOT NULL THEN
+        INSERT INTO task_completions (user_id, task_id, completed_date)
+        SELECT user_id, task_id, completed_date FROM legacy_completions;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS daily_completion_rollups (
+    day DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    tandem_id INTEGER,
+    completions INTEGER NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS scheduled_challenges (
+    id SERIAL PRIMARY KEY,
+    task_ids INTEGER[] NOT NULL,
+    message_text TEXT,
+    send_time TIMESTAMP NOT NULL,
+    sent BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS pitstop_links (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS scheduled_messages (
+    id SERIAL PRIMARY KEY,
+    message_type TEXT NOT NULL,
+    scheduled_time TIMESTAMP NOT NULL,
+    target_chat_id BIGINT,
+    forward_from_message_id INTEGER,
+    text TEXT,
+    sent BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE scheduled_challenges ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+ALTER TABLE scheduled_messages ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    job TEXT NOT NULL,
+    run_key TEXT NOT NULL,
+    instance_id TEXT NOT NULL,
+    claimed_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (job, run_key)
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_type TEXT NOT NULL,
+    broadcast_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at TIMESTAMP,
+    last_error TEXT,
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (broadcast_type, broadcast_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data BYTEA,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_completions_date
+ON task_completions(completed_date);
+
+CREATE INDEX IF NOT EXISTS idx_completion_rollups_tandem_day
+ON daily_completion_rollups(tandem_id, day) WHERE tandem_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_challenges_time
+ON scheduled_challenges(send_time) WHERE sent = FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_messages_time
+ON scheduled_messages(scheduled_time) WHERE sent = FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_pending
+ON broadcast_deliveries(broadcast_type, broadcast_id, user_id) WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_tandem_scores_score
+ON tandem_scores(score, tandem_id);
+
+-- Covers the members side of partner lookups, leaderboard names and the reminder anti-join;
+-- score stays out of it so toggles keep their HOT updates
+CREATE INDEX IF NOT EXISTS idx_users_tandem_members
+ON users(tandem_id, user_id) INCLUDE (name, timezone) WHERE tandem_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_expires
+ON fsm_states(expires_at);
+
+INSERT INTO tandem_scores (tandem_id, score)
+SELECT t.id, COALESCE(SUM(u.score), 0)
+FROM tandems t
+LEFT JOIN users u ON u.tandem_id = t.id
+WHERE NOT EXISTS (SELECT 1 FROM tandem_scores ts WHERE ts.tandem_id = t.id)
+GROUP BY t.id
+ON CONFLICT (tandem_id) DO NOTHING;
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot, Dispatcher, F, Router  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+from handlers.dispatch import CallbackTable  # noqa: E402
+from keyboards import callbacks as cb  # noqa: E402
+from keyboards.pagination import page_callback  # noqa: E402
+from services.message_dealer import MessageDealer  # noqa: E402
+
+# Filter chains in the order the routers registered them before the typed codec
+LEGACY_START = [
+    F.data == 'type_tandem_name',
+    F.data.startswith('task_') & F.data.endswith('_check'),
+    F.data == 'delete_me',
+]
+LEGACY_ADMIN = [
+    F.data == 'admin_back',
+    F.data == 'admin_tasks',
+    F.data.startswith('tpg:'),
+    F.data == 'task_add',
+    F.data.startswith('task_view_'),
+    F.data.startswith('task_delete_'),
+    F.data.startswith('task_edit_'),
+    F.data == 'admin_links',
+    F.data.startswith('lpg:'),
+    F.data == 'link_add',
+    F.data.startswith('link_view_'),
+    F.data.startswith('link_delete_'),
+    F.data == 'admin_stats',
+    F.data.startswith('spg:'),
+    F.data.startswith('tandem_stats_'),
+    F.data == 'admin_schedule',
+    F.data == 'schedule_challenge_add',
+    F.data.startswith('task_select_'),
+    F.data == 'tasks_selected_done',
+    F.data == 'admin_notify',
+    F.data == 'admin_scheduled_messages',
+    F.data == 'admin_table',
+    F.data.startswith('lbpg:'),
+    F.data.startswith('task_') & F.data.endswith('_single'),
+]
+
+TABLE_START = [cb.TANDEM_NAME, cb.TRACKER_CHECK, cb.TRACKER_CLOSE, cb.DELETE_ME]
+TABLE_ADMIN = [
+    cb.ADMIN_BACK, cb.ADMIN_TASKS, cb.TASKS_PAGE, cb.TASK_ADD, cb.TASK_VIEW, cb.TASK_DELETE, cb.TASK_EDIT,
+    cb.ADMIN_LINKS, cb.LINKS_PAGE, cb.LINK_ADD, cb.LINK_VIEW, cb.LINK_DELETE, cb.ADMIN_STATS, cb.STATS_PAGE,
+    cb.TANDEM_STATS, cb.ADMIN_SCHEDULE, cb.SCHEDULE_CHALLENGE_ADD, cb.TASK_SELECT, cb.TASKS_SELECTED_DONE,
+    cb.ADMIN_NOTIFY, cb.ADMIN_SCHEDULED_MESSAGES, cb.ADMIN_TABLE, cb.LEADERBOARD_PAGE, cb.TRACKER_SINGLE,
+]
+
+SAMPLES: List[Tuple[str, str, str]] = [
+    ('трекер', 'task_12_check', cb.pack(cb.TRACKER_CHECK, 12)),
+    ('просмотр задачи', 'task_view_12', cb.pack(cb.TASK_VIEW, 12)),
+    ('страница рейтинга', 'lbpg:n:1a.2b.3', page_callback(cb.LEADERBOARD_PAGE, False, (46, 83, 3))),
+    ('челлендж', 'task_12_single', cb.pack(cb.TRACKER_SINGLE, 12)),
+    ('неизвестная', 'unknown_button', '~'),
+]
+
+
+async def noop(*args, **kwargs):
+    return None
+
+
+def legacy_dispatcher() -> Dispatcher:
+    dp = Dispatcher(md=MessageDealer())
+    for filters in (LEGACY_START, LEGACY_ADMIN):
+        router = Router()
+        for flt in filters:
+            router.callback_query.register(noop, flt)
+        dp.include_router(router)
+    return dp
+
+
+def table_dispatcher() -> Dispatcher:
+    dp = Dispatcher(md=MessageDealer())
+    for prefixes in (TABLE_START, TABLE_ADMIN):
+        router = Router()
+        table = CallbackTable(router)
+        for prefix in prefixes:
+            table(prefix)(noop)
+        dp.include_router(router)
+    return dp
+
+
+def callback_update(data: str) -> Update:
+    return Update.model_validate({
+        'update_id': 1,
+        'callback_query': {
+            'id': '1',
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'Bench'},
+            'chat_instance': '1',
+            'data': data,
+        },
+    })
+
+
+async def measure(dp: Dispatcher, bot: Bot, update: Update, iterations: int) -> float:
+    for _ in range(min(iterations, 200)):
+        await dp.feed_update(bot, update)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+async def run(iterations: int):
+    bot = Bot('42:BENCHMARK')
+    legacy, table = legacy_dispatcher(), table_dispatcher()
+    print(f"{'callback':<20}{'фильтры, мкс':>14}{'таблица, мкс':>14}{'ускорение':>11}")
+    try:
+        for label, legacy_data, table_data in SAMPLES:
+            before = await measure(legacy, bot, callback_update(legacy_data), iterations)
+            after = await measure(table, bot, callback_update(table_data), iterations)
+            print(f"{label:<20}{before:>14.1f}{after:>14.1f}{before / after:>10.1f}x")
+    finally:
+        await bot.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнивает стоимость маршрутизации callback-запросов: цепочки фильтров против таблицы префиксов")
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == '__main__':
+    main()
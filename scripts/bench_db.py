@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from services.database import PostgresService, _add_months, _month_start  # noqa: E402
+from services.statements import STATEMENTS  # noqa: E402
+
+BASE_USER_ID = 1_000_000
+SEED_TABLES = (
+    'task_completions', 'daily_completion_rollups', 'daily_stats', 'tandem_scores',
+    'users', 'tandems', 'tasks', 'scheduler_runs', 'broadcast_deliveries',
+)
+
+# Statements that read every user by design; any other sequential scan of a large table fails --explain
+FULL_SCANS: Dict[str, Set[str]] = {
+    'users_with_incomplete_tasks': {'users'},
+    'users_with_incomplete_tasks_page': {'users'},
+    'user_timezones': {'users'},
+    'rollover_users': {'users', 'daily_stats'},
+    'broadcast_enqueue': {'users'},
+}
+
+Case = Tuple[str, Callable[[random.Random], Awaitable[Any]]]
+
+
+async def seed(db: PostgresService, args: argparse.Namespace):
+    today = date.today()
+    async with db.pool.acquire() as conn:
+        await conn.execute(f"TRUNCATE {', '.join(SEED_TABLES)} RESTART IDENTITY CASCADE")
+        await conn.execute('SELECT setseed($1)', 0.42)
+        await conn.execute('''
+            INSERT INTO tasks (title, description, points, active)
+            SELECT 'Задача ' || i, 'Описание задачи ' || i, 1 + i % 3, i % 5 <> 0
+            FROM generate_series(1, $1) i
+        ''', args.tasks)
+        await conn.execute("INSERT INTO tandems (name) SELECT 'Тандем ' || i FROM generate_series(1, $1) i", args.tandems)
+        await conn.execute('''
+            INSERT INTO users (user_id, name, tandem_id, score)
+            SELECT $1 + i, 'Участник ' || i, CASE WHEN i < $3 * 2 THEN i / 2 + 1 END, (random() * 100)::int
+            FROM generate_series(0, $2 - 1) i
+        ''', BASE_USER_ID, args.users, args.tandems)
+        await conn.execute('''
+            INSERT INTO tandem_scores (tandem_id, score)
+            SELECT tandem_id, SUM(score) FROM users WHERE tandem_id IS NOT NULL GROUP BY tandem_id
+        ''')
+        await conn.execute('''
+            INSERT INTO task_completions (user_id, task_id, completed_date)
+            SELECT u.user_id, t.id, $1::date - d
+            FROM users u CROSS JOIN tasks t CROSS JOIN generate_series(0, $2 - 1) d
+            WHERE t.active AND random() < $3
+        ''', today, args.days, args.completion_rate)
+
+        month = _month_start(today - timedelta(days=args.days - 1))
+        while month <= _month_start(today):
+            await db._ensure_completion_partition(conn, month)
+            month = _add_months(month, 1)
+
+    # Rolls every finished day up, exactly as the nightly job would
+    await db.reset_daily_stats()
+    async with db.pool.acquire() as conn:
+        await conn.execute('ANALYZE')
+        return {
+            'users': await conn.fetchval('SELECT COUNT(*) FROM users'),
+            'tandems': await conn.fetchval('SELECT COUNT(*) FROM tandems'),
+            'tasks': await conn.fetchval('SELECT COUNT(*) FROM tasks'),
+            'completions': await conn.fetchval('SELECT COUNT(*) FROM task_completions'),
+            'rollups': await conn.fetchval('SELECT COUNT(*) FROM daily_completion_rollups'),
+        }
+
+
+async def drain(iterator) -> int:
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+
+def build_cases(db: PostgresService, args: argparse.Namespace, task_ids: List[int]) -> List[Case]:
+    def user(rng: random.Random) -> int:
+        return BASE_USER_ID + rng.randrange(args.users)
+
+    def paired_user(rng: random.Random) -> int:
+        return BASE_USER_ID + rng.randrange(max(1, args.tandems * 2))
+
+    def tandem(rng: random.Random) -> int:
+        return rng.randint(1, max(1, args.tandems))
+
+    return [
+        ('toggle_task', lambda rng: db.toggle_task(user(rng), rng.choice(task_ids))),
+        ('toggle_task_with_state', lambda rng: db.toggle_task_with_state(user(rng), rng.choice(task_ids))),
+        ('get_today_stats', lambda rng: db.get_today_stats(user(rng))),
+        ('get_user_session', lambda rng: db.get_user_session(user(rng))),
+        ('get_partner_id', lambda rng: db.get_partner_id(paired_user(rng))),
+        ('get_tandem_info', lambda rng: db.get_tandem_info(paired_user(rng))),
+        ('get_tandem_score_breakdown', lambda rng: db.get_tandem_score_breakdown(tandem(rng))),
+        ('get_tandem_summary', lambda rng: db.get_tandem_summary(tandem(rng))),
+        ('get_tandem_rank', lambda rng: db.get_tandem_rank(tandem(rng))),
+        ('get_tandem_statistics', lambda rng: db.get_tandem_statistics(tandem(rng))),
+        ('get_tandems_statistics', lambda rng: db.get_tandems_statistics(rng.sample(range(1, args.tandems + 1), min(20, args.tandems)))),
+        ('get_all_tandems_list', lambda rng: db.get_all_tandems_list()),
+        ('get_leaderboard_page', lambda rng: db.get_leaderboard_page()),
+        ('get_all_users', lambda rng: db.get_all_users()),
+        ('get_tasks_page', lambda rng: db.get_tasks_page()),
+        ('get_users_with_incomplete_tasks', lambda rng: db.get_users_with_incomplete_tasks(task_ids)),
+        ('iter_users_with_incomplete_tasks', lambda rng: drain(db.iter_users_with_incomplete_tasks(task_ids))),
+    ]
+
+
+async def measure(case: Callable[[random.Random], Awaitable[Any]], iterations: int, warmup: int, rng: random.Random) -> Dict[str, float]:
+    for _ in range(warmup):
+        await case(rng)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await case(rng)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def plan_args(args: argparse.Namespace, task_ids: List[int], default_timezone: str) -> Dict[str, tuple]:
+    user, tandem, today = BASE_USER_ID + 1, 1, date.today()
+    tandems = list(range(1, min(20, args.tandems) + 1))
+    return {
+        'user_session': (user,),
+        'lock_member': (user,),
+        'toggle_task': (user, task_ids[0], today),
+        'today_completions': (user, today),
+        'tandem_score_breakdown': (tandem,),
+        'leaderboard': (0, 20),
+        'leaderboard_after': (50, tandem, 20),
+        'leaderboard_before': (50, tandem, 20),
+        'tandem_rank': (tandem,),
+        'tasks_after': (0, 10),
+        'tasks_before': (2 ** 31 - 1, 10),
+        'links_after': (0, 10),
+        'links_before': (2 ** 31 - 1, 10),
+        'tandems_statistics': (tandems, today - timedelta(days=6)),
+        'users_with_incomplete_tasks': (task_ids, default_timezone, None),
+        'users_with_incomplete_tasks_page': (task_ids, default_timezone, None, 0, 1000),
+        'user_timezones': (default_timezone,),
+        'rollover_users': (default_timezone, None),
+        'claim_challenges': (datetime.now(), 600.0, 1),
+        'claim_messages': (datetime.now(), 600.0, 1),
+        'broadcast_claim': ('notify', 1, 500, 300.0),
+        'broadcast_enqueue': ('notify', 1),
+        'fsm_get': ('bench:1:1',),
+    }
+
+
+def seq_scans(plan: Dict[str, Any]) -> Iterator[str]:
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+async def explain(db: PostgresService, args: argparse.Namespace, task_ids: List[int]) -> List[str]:
+    failures = []
+    async with db.pool.acquire() as conn:
+        sizes = {row['relname']: row['reltuples'] for row in await conn.fetch(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")}
+        for name, params in plan_args(args, task_ids, db.default_timezone).items():
+            plan = json.loads(await conn.fetchval(f'EXPLAIN (FORMAT JSON) {STATEMENTS[name]}', *params))[0]['Plan']
+            large = sorted({
+                table for table in seq_scans(plan)
+                if sizes.get(table, 0) >= args.min_rows and table not in FULL_SCANS.get(name, ())
+            })
+            status = f"Seq Scan: {', '.join(large)}" if large else 'ok'
+            print(f"{name:<34}{plan['Total Cost']:>12.1f}  {status}")
+            if large:
+                failures.append(name)
+    unchecked = sorted(set(STATEMENTS) - set(plan_args(args, task_ids, db.default_timezone)))
+    if unchecked:
+        print(f"Без проверки плана: {', '.join(unchecked)}")
+    return failures
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Any], metric: str, threshold: float) -> List[str]:
+    if baseline.get('sizes') and baseline['sizes'] != results['sizes']:
+        print(f"Внимание: размеры данных отличаются от базовых {baseline['sizes']}")
+    regressions = []
+    print(f"{'метод':<34}{'база':>10}{'сейчас':>10}{'Δ, %':>9}")
+    for name, current in results['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get(metric):
+            print(f"{name:<34}{'—':>10}{current[metric]:>10.3f}{'новый':>9}")
+            continue
+        delta = (current[metric] - base[metric]) / base[metric] * 100
+        mark = ' ✗' if delta > threshold else ''
+        print(f"{name:<34}{base[metric]:>10.3f}{current[metric]:>10.3f}{delta:>+9.1f}{mark}")
+        if delta > threshold:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    # Keep every seeded month: the rollover drops partitions past the retention window
+    db = PostgresService(args.dsn, completion_history_months=args.days // 28 + 2)
+    await db.migrate()
+    await db.connect()
+    try:
+        if not args.no_seed:
+            started = time.perf_counter()
+            counts = await seed(db, args)
+            print(f"Данные засеяны за {time.perf_counter() - started:.1f} с: {counts}")
+        await db.load_known_users()
+
+        task_ids = [task['id'] for task in await db.get_all_tasks(active_only=True)]
+        if not task_ids:
+            print("Нет активных задач — нечего измерять")
+            return 2
+
+        if args.explain:
+            failures = await explain(db, args, task_ids)
+            if failures:
+                print(f"Последовательное чтение таблиц от {args.min_rows} строк: {', '.join(failures)}")
+                return 1
+            print("Горячие запросы обходятся без последовательного чтения больших таблиц")
+            return 0
+
+        selected = set(args.only.split(',')) if args.only else None
+        results = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'sizes': {'users': args.users, 'tandems': args.tandems, 'tasks': args.tasks, 'days': args.days, 'completion_rate': args.completion_rate},
+            'results': {},
+        }
+        for name, case in build_cases(db, args, task_ids):
+            if selected and name not in selected:
+                continue
+            results['results'][name] = await measure(case, args.iterations, args.warmup, random.Random(name))
+            stats = results['results'][name]
+            print(f"{name:<34}p50 {stats['p50_ms']:>8.3f} мс  p95 {stats['p95_ms']:>8.3f} мс  mean {stats['mean_ms']:>8.3f} мс")
+    finally:
+        await db.disconnect()
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Результаты сохранены в {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.metric, args.threshold)
+        if regressions:
+            print(f"Регрессия больше {args.threshold}%: {', '.join(regressions)}")
+            return 1
+        print(f"Регрессий больше {args.threshold}% нет")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Засевает отдельную базу и замеряет методы PostgresService; все таблицы бота в ней очищаются")
+    parser.add_argument('dsn', help="postgresql://… отдельной базы для бенчмарка")
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--tandems', type=int, default=4_000, help="тандемы собираются из первых 2×N пользователей")
+    parser.add_argument('--tasks', type=int, default=10)
+    parser.add_argument('--days', type=int, default=30, help="дней истории выполнений")
+    parser.add_argument('--completion-rate', type=float, default=0.5, help="вероятность выполнить задачу за день")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', default='', help="методы через запятую")
+    parser.add_argument('--no-seed', action='store_true', help="мерить на уже засеянной базе")
+    parser.add_argument('--save', default='', help="записать результаты в JSON")
+    parser.add_argument('--compare', default='', help="сравнить с сохранённым JSON")
+    parser.add_argument('--metric', default='p50_ms', choices=['p50_ms', 'p95_ms', 'mean_ms'])
+    parser.add_argument('--threshold', type=float, default=10.0, help="допустимый рост метрики, %%")
+    parser.add_argument('--explain', action='store_true', help="вместо замеров проверить планы горячих запросов")
+    parser.add_argument('--min-rows', type=int, default=10_000, help="с какого размера таблицы Seq Scan считается ошибкой")
+    args = parser.parse_args()
+    args.users = max(args.users, args.tandems * 2)
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+from aiohttp import web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Tandem', 'username': 'tandem_load_bot'}
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 1,
+        blocked: Iterable[int] = (),
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.blocked = set(blocked)
+        self.calls: Counter = Counter()
+        self.flooded: Counter = Counter()
+        self.forbidden: Counter = Counter()
+        self._random = random.Random(seed)
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._methods = {
+            'getme': self._get_me,
+            'sendmessage': self._send_message,
+            'sendphoto': self._send_message,
+            'editmessagetext': self._edit_message,
+            'editmessagereplymarkup': self._edit_message,
+            'forwardmessage': self._send_message,
+            'copymessage': self._copy_message,
+            'answercallbackquery': self._ok,
+            'deletemessage': self._ok,
+            'setwebhook': self._ok,
+            'deletewebhook': self._ok,
+        }
+
+    def block(self, *chat_ids: int):
+        self.blocked.update(chat_ids)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        handler = self._methods.get(method)
+        if handler is None:
+            return self._error(404, f'Not Found: method {method} is not emulated')
+
+        chat_id = self._int(params.get('chat_id'))
+        if chat_id in self.blocked and method != 'answercallbackquery':
+            self.forbidden[method] += 1
+            return self._error(403, 'Forbidden: bot was blocked by the user')
+        if self.flood_rate and method != 'getme' and self._random.random() < self.flood_rate:
+            self.flooded[method] += 1
+            return self._error(429, f'Too Many Requests: retry after {self.retry_after}', retry_after=self.retry_after)
+
+        return web.json_response({'ok': True, 'result': handler(params)})
+
+    def summary(self) -> str:
+        lines = [f"{method}: {count}" for method, count in self.calls.most_common()]
+        if self.flooded:
+            lines.append(f"429: {sum(self.flooded.values())} {dict(self.flooded)}")
+        if self.forbidden:
+            lines.append(f"403: {sum(self.forbidden.values())} {dict(self.forbidden)}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _int(value: Any) -> Optional[int]:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _error(code: int, description: str, **parameters: Any) -> web.Response:
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=code)
+
+    def _next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def _message(self, chat_id: Optional[int], message_id: int, text: Optional[str]) -> Dict[str, Any]:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id or 0, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if text is not None:
+            message['text'] = text
+        return message
+
+    def _get_me(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return BOT_USER
+
+    def _send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self._message(self._int(params.get('chat_id')), self._next_message_id(), params.get('text') or params.get('caption'))
+
+    def _edit_message(self, params: Dict[str, Any]) -> Any:
+        if params.get('inline_message_id'):
+            return True
+        return self._message(self._int(params.get('chat_id')), self._int(params.get('message_id')) or 0, params.get('text'))
+
+    def _copy_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {'message_id': self._next_message_id()}
+
+    def _ok(self, params: Dict[str, Any]) -> bool:
+        return True
+
+
+async def serve(api: FakeBotAPI, host: str, port: int):
+    await api.start(host, port)
+    print(f"Фейковый Bot API слушает http://{host}:{port} (Ctrl+C для остановки)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.close()
+        print(api.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API для нагрузочного тестирования")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.03, help="базовая задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.02, help="случайная добавка к задержке, с")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="доля запросов, получающих 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--blocked', default='', help="chat_id через запятую, для которых вернётся 403")
+    args = parser.parse_args()
+
+    blocked = [int(chat_id) for chat_id in args.blocked.split(',') if chat_id.strip()]
+    api = FakeBotAPI(args.latency, args.jitter, args.flood_rate, args.retry_after, blocked)
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
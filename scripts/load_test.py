@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from config import load_config  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from keyboards.callbacks import pack, ADMIN_NOTIFY, TRACKER_CHECK  # noqa: E402
+from main import create_bot, create_dispatcher  # noqa: E402
+
+LOAD_TOKEN = '123456:LOADTEST'
+
+
+def percentile(values: List[float], share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class LoadGenerator:
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int):
+        self.dp = dp
+        self.bot = bot
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next_ids(self):
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Нагрузка {user_id}'}
+
+    def message(self, user_id: int, text: str) -> Update:
+        update_id, message_id = self._next_ids()
+        return Update.model_validate({
+            'update_id': update_id,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self._user(user_id),
+                'text': text,
+            },
+        }, context={'bot': self.bot})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        update_id, message_id = self._next_ids()
+        return Update.model_validate({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': user_id, 'type': 'private'},
+                    'from': {'id': 1, 'is_bot': True, 'first_name': 'Tandem'},
+                    'text': 'load',
+                },
+            },
+        }, context={'bot': self.bot})
+
+    async def feed(self, scenario: str, update: Update):
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.errors[scenario] += 1
+                logger.debug(f"{scenario}: {e!r}")
+            self.latencies[scenario].append(time.perf_counter() - started)
+
+    async def pair(self, inviter: int, invitee: int):
+        await self.feed('/start', self.message(inviter, '/start'))
+        await self.feed('имя', self.message(inviter, f'Тест{inviter % 10000}'))
+        await self.feed('/start ref', self.message(invitee, f'/start ref{inviter}'))
+        await self.feed('имя', self.message(invitee, f'Тест{invitee % 10000}'))
+
+    async def play(self, user_id: int, task_ids: List[int], rounds: int, rng: random.Random):
+        for _ in range(rounds):
+            await self.feed('🚴‍♂️ Трекер', self.message(user_id, '🚴‍♂️ Трекер'))
+            if task_ids:
+                await self.feed('отметка задачи', self.callback(user_id, pack(TRACKER_CHECK, rng.choice(task_ids))))
+            await self.feed('🗺 Карта', self.message(user_id, '🗺 Карта'))
+
+    async def broadcast(self, admin_id: int, text: str) -> float:
+        await self.feed('админ: рассылка', self.callback(admin_id, pack(ADMIN_NOTIFY)))
+        started = time.perf_counter()
+        await self.feed('админ: рассылка', self.message(admin_id, text))
+        await self.dp['broadcaster'].join()
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"{'сценарий':<20}{'апд.':>7}{'ошибки':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+        for scenario, values in self.latencies.items():
+            values = sorted(values)
+            print(f"{scenario:<20}{len(values):>7}{self.errors.get(scenario, 0):>8}"
+                  f"{percentile(values, 0.5) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}"
+                  f"{percentile(values, 0.99) * 1000:>10.1f}")
+        print(f"Всего {total} апдейтов за {elapsed:.2f} с ({total / elapsed:.1f} апд./с)")
+
+
+async def seed_tasks(db, count: int) -> List[int]:
+    tasks = await db.get_all_tasks(active_only=True)
+    for index in range(len(tasks), count):
+        await db.create_task(f'Нагрузочная задача {index + 1}', 'Создана scripts/load_test.py', 1)
+    return [task['id'] for task in await db.get_all_tasks(active_only=True)]
+
+
+async def run(args: argparse.Namespace):
+    config = load_config()
+    config.bot.token = LOAD_TOKEN
+    admin_id = args.base_id
+    config.bot.admin_ids = [admin_id]
+
+    api: Optional[FakeBotAPI] = None
+    api_url = args.api
+    if not api_url:
+        api = FakeBotAPI(args.latency, args.jitter, args.flood_rate, args.retry_after, seed=args.seed)
+        await api.start(port=args.port)
+        api_url = f'http://127.0.0.1:{args.port}'
+
+    bot = create_bot(config, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = create_dispatcher(config, bot)
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    generator = LoadGenerator(dp, bot, args.concurrency)
+    rng = random.Random(args.seed)
+    try:
+        task_ids = await seed_tasks(dp['db'], args.tasks)
+        users = [args.base_id + 1 + index for index in range(args.users - args.users % 2)]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(generator.pair(users[i], users[i + 1]) for i in range(0, len(users), 2)))
+        print(f"Тандемов создано: {len(users) // 2} за {time.perf_counter() - started:.2f} с")
+
+        blocked = set(rng.sample(users, int(len(users) * args.blocked)))
+        if api:
+            api.block(*blocked)
+        active = [user_id for user_id in users if user_id not in blocked]
+        await asyncio.gather(*(generator.play(user_id, task_ids, args.rounds, random.Random(rng.random())) for user_id in active))
+
+        for number in range(args.broadcasts):
+            duration = await generator.broadcast(admin_id, f'Нагрузочная рассылка {number + 1}')
+            print(f"Рассылка {number + 1}: {duration:.2f} с")
+
+        generator.report(time.perf_counter() - started)
+        if api:
+            print(api.summary())
+    finally:
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await bot.session.close()
+        if api:
+            await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Гоняет смоделированных пользователей через настоящий Dispatcher против фейкового Bot API")
+    parser.add_argument('--users', type=int, default=200, help="число пользователей (парами в тандемы)")
+    parser.add_argument('--rounds', type=int, default=5, help="циклов Трекер → отметка → Карта на пользователя")
+    parser.add_argument('--concurrency', type=int, default=64, help="апдейтов в обработке одновременно")
+    parser.add_argument('--tasks', type=int, default=5, help="минимум активных задач в каталоге")
+    parser.add_argument('--broadcasts', type=int, default=1, help="админских рассылок после активности")
+    parser.add_argument('--blocked', type=float, default=0.05, help="доля пользователей, заблокировавших бота")
+    parser.add_argument('--base-id', type=int, default=9_000_000_000 + int(time.time()) % 100_000 * 10_000,
+                        help="user_id администратора; пользователи идут следом")
+    parser.add_argument('--api', default='', help="адрес внешнего Bot API вместо встроенного фейкового")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--flood-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='DEBUG' if args.verbose else 'WARNING')
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from aiohttp import ClientSession, ClientTimeout
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def load_updates(path: Path) -> List[dict]:
+    text = path.read_text(encoding='utf-8').strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def replay(url: str, updates: List[dict], secret: str, concurrency: int, repeat: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    latencies = []
+    headers = {SECRET_HEADER: secret} if secret else {}
+    next_id = max((u.get('update_id', 0) for u in updates), default=0) + 1
+
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        async def post(update: dict):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        batch = []
+        for round_no in range(repeat):
+            for update in updates:
+                if round_no:
+                    update = {**update, 'update_id': next_id}
+                    next_id += 1
+                batch.append(post(update))
+
+        started = time.perf_counter()
+        await asyncio.gather(*batch)
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    print(f"Отправлено {count} апдейтов за {elapsed:.2f} с ({count / elapsed:.1f} апд./с)")
+    print(f"Статусы: {statuses}")
+    if count:
+        print(f"Задержка: p50 {latencies[count // 2] * 1000:.1f} мс, "
+              f"p95 {latencies[min(count - 1, int(count * 0.95))] * 1000:.1f} мс, "
+              f"max {latencies[-1] * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проигрывает записанные апдейты Telegram в локальный webhook")
+    parser.add_argument('file', type=Path, help="JSON-файл или JSON Lines с апдейтами")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file)
+    if not updates:
+        sys.exit("Файл не содержит апдейтов")
+    asyncio.run(replay(args.url, updates, args.secret, args.concurrency, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
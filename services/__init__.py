@@ -1,2 +1,3 @@
 from .database import AbstractDatabase, PostgresService
-from .message_dealer import MessageDealer
\ No newline at end of file
+from .message_dealer import MessageDealer
+from .broadcaster import Broadcaster
\ No newline at end of file
@@ -0,0 +1,304 @@
+import asyncio
+import inspect
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from loguru import logger
+
+if TYPE_CHECKING:
+    from services.database import AbstractDatabase
+
+
+Recipients = Union[Iterable[int], AsyncIterable[int]]
+DeliverFunc = Callable[[int], Awaitable[Any]]
+ProgressFunc = Callable[['BroadcastStats'], Awaitable[Any]]
+ResultFunc = Callable[[int, str, Optional[str]], Any]
+
+DELIVERY_SENT = 'sent'
+DELIVERY_BLOCKED = 'blocked'
+DELIVERY_FAILED = 'failed'
+
+_current_stats: ContextVar[Optional['BroadcastStats']] = ContextVar('broadcast_stats', default=None)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        # Refill starts when the pause ends, otherwise the pause itself would be paid out as a burst
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    name: str
+    total: Optional[int] = None
+    processed: int = 0
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    api_calls: int = 0
+    retries: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def recipients_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def calls_per_second(self) -> float:
+        return self.api_calls / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        total = self.total if self.total is not None else '?'
+        summary = (
+            f"{self.processed}/{total}: отправлено {self.sent}, заблокировали {self.blocked}, "
+            f"ошибок {self.failed}, повторов {self.retries}; "
+            f"{self.recipients_per_second:.1f} получ./с, {self.calls_per_second:.1f} запр./с, "
+            f"{self.elapsed:.1f} с"
+        )
+        if self.errors:
+            summary += " (" + ", ".join(f"{name}: {count}" for name, count in sorted(self.errors.items())) + ")"
+        return summary
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        rate: float = 28.0,
+        per_chat_interval: float = 1.0,
+        workers: int = 32,
+        progress_interval: float = 5.0,
+        max_retries: int = 3,
+        ledger_batch_size: int = 500,
+        ledger_lease: float = 300.0,
+        ledger_flush_size: int = 50,
+        ledger_flush_interval: float = 1.0,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.max_retries = max_retries
+        self.ledger_batch_size = ledger_batch_size
+        self.ledger_lease = ledger_lease
+        self.ledger_flush_size = ledger_flush_size
+        self.ledger_flush_interval = ledger_flush_interval
+        self._chat_next: Dict[int, float] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    async def call(self, chat_id: int, request: Callable[[], Awaitable[Any]]) -> Any:
+        stats = _current_stats.get()
+        attempt = 0
+        while True:
+            delay = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.bucket.acquire()
+            self._chat_next[chat_id] = time.monotonic() + self.per_chat_interval
+            try:
+                result = await request()
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if stats:
+                    stats.retries += 1
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(f"Flood control: пауза {e.retry_after} с (чат {chat_id})")
+                self.bucket.pause(e.retry_after)
+                continue
+            if stats:
+                stats.api_calls += 1
+            return result
+
+    async def run(
+        self,
+        name: str,
+        recipients: Recipients,
+        deliver: DeliverFunc,
+        total: Optional[int] = None,
+        progress: Optional[ProgressFunc] = None,
+        on_result: Optional[ResultFunc] = None,
+    ) -> BroadcastStats:
+        stats = BroadcastStats(name=name, total=total)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+
+        async def produce():
+            if isinstance(recipients, AsyncIterable):
+                try:
+                    async for user_id in recipients:
+                        await queue.put(user_id)
+                finally:
+                    if hasattr(recipients, 'aclose'):
+                        await recipients.aclose()
+            else:
+                for user_id in recipients:
+                    await queue.put(user_id)
+            # Only on success: after a failure the task group cancels the workers, and a put into
+            # a full queue here would never return
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work():
+            while True:
+                user_id = await queue.get()
+                if user_id is None:
+                    return
+                status, error = DELIVERY_SENT, None
+                try:
+                    await deliver(user_id)
+                    stats.sent += 1
+                except TelegramForbiddenError:
+                    status = DELIVERY_BLOCKED
+                    stats.blocked += 1
+                except Exception as e:
+                    logger.error(f"Рассылка {name}: ошибка отправки {user_id}: {e}")
+                    status, error = DELIVERY_FAILED, str(e)
+                    stats.failed += 1
+                    error_type = type(e).__name__
+                    stats.errors[error_type] = stats.errors.get(error_type, 0) + 1
+                finally:
+                    stats.processed += 1
+                if on_result:
+                    result = on_result(user_id, status, error)
+                    if inspect.isawaitable(result):
+                        await result
+
+        async def report_once():
+            try:
+                await progress(stats)
+            except Exception as e:
+                logger.warning(f"Рассылка {name}: не удалось обновить прогресс: {e}")
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                await report_once()
+
+        reporter = asyncio.create_task(report()) if progress else None
+        token = _current_stats.set(stats)
+        try:
+            # A failing producer or on_result (a ledger write) cancels every sibling, so nothing keeps
+            # sending or claiming recipients after run() has raised
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce())
+                for _ in range(self.workers):
+                    group.create_task(work())
+        except BaseExceptionGroup as e:
+            raise e.exceptions[0]
+        finally:
+            _current_stats.reset(token)
+            stats.finished_at = time.monotonic()
+            if reporter:
+                reporter.cancel()
+            self._forget_idle_chats()
+
+        if progress:
+            await report_once()
+        logger.info(f"Рассылка {name} завершена: {stats.summary()}")
+        return stats
+
+    async def run_tracked(
+        self,
+        db: 'AbstractDatabase',
+        broadcast_type: str,
+        broadcast_id: int,
+        deliver: DeliverFunc,
+        progress: Optional[ProgressFunc] = None,
+    ) -> BroadcastStats:
+        pending = await db.enqueue_broadcast(broadcast_type, broadcast_id)
+        results: List[Tuple[int, str, Optional[str]]] = []
+        flushed_at = time.monotonic()
+
+        async def flush():
+            nonlocal flushed_at
+            flushed_at = time.monotonic()
+            if results:
+                batch = results[:]
+                results.clear()
+                await db.record_broadcast_results(broadcast_type, broadcast_id, batch)
+
+        async def record(user_id: int, status: str, error: Optional[str]):
+            # Written every ledger_flush_size results or ledger_flush_interval seconds: after a crash only
+            # the unwritten tail is resent once its lease expires
+            results.append((user_id, status, error))
+            if len(results) >= self.ledger_flush_size or time.monotonic() - flushed_at >= self.ledger_flush_interval:
+                await flush()
+
+        async def recipients():
+            while True:
+                await flush()
+                batch = await db.claim_broadcast_batch(
+                    broadcast_type, broadcast_id, self.ledger_batch_size, self.ledger_lease
+                )
+                if not batch:
+                    return
+                for user_id in batch:
+                    yield user_id
+
+        try:
+            return await self.run(
+                f"{broadcast_type}:{broadcast_id}", recipients(), deliver,
+                total=pending, progress=progress,
+                on_result=record,
+            )
+        finally:
+            await flush()
+
+    def start(self, name: str, recipients: Recipients, deliver: DeliverFunc, total: Optional[int] = None, progress: Optional[ProgressFunc] = None) -> asyncio.Task:
+        return self.spawn(self.run(name, recipients, deliver, total=total, progress=progress))
+
+    def spawn(self, coro: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._on_background_done)
+        return task
+
+    async def join(self):
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def _on_background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Фоновая рассылка завершилась с ошибкой: {task.exception()}")
+
+    def _forget_idle_chats(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, ready in self._chat_next.items() if ready <= now]:
+            del self._chat_next[chat_id]
+
+
+async def log_progress(stats: BroadcastStats):
+    logger.info(f"Рассылка {stats.name}: {stats.summary()}")
@@ -1,17 +1,61 @@
+import asyncio
+import functools
+import inspect
+import time
+import uuid
 import asyncpg
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, List, Any
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Any, Tuple, Callable, Set, AsyncIterator, AsyncContextManager
 from loguru import logger
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+
+from services.cache import LRUCache
+from services.migrations import apply_migrations, load_migrations
+from services.metrics import DB_METHOD_ERRORS, DB_METHOD_SECONDS, DB_QUERIES, DB_QUERY_SECONDS, register_pool_gauges
+from services.statements import PreparedConnection
+from services.timezones import DEFAULT_TIMEZONE, EARLIEST_TIMEZONE, LATEST_TIMEZONE, local_today
+
+CATALOG_CHANNEL = 'catalog_changed'
+SESSION_CHANNEL = 'sessions_changed'
+SCHEDULE_CHANNEL = 'schedules_changed'
+LEADERBOARD_START = (2 ** 31 - 1, 2 ** 31 - 1)
+
+Cursor = Tuple[int, ...]
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f'task_completions_p{month.year:04d}{month.month:02d}'
 
 
 class AbstractDatabase(ABC):
+    @property
+    @abstractmethod
+    def catalog_version(self) -> int: pass
+
+    @property
+    @abstractmethod
+    def skipped_upserts(self) -> int: pass
+
     @abstractmethod
     async def register_user(self, user_id: int) -> None: pass
     
     @abstractmethod
     async def get_user_info(self, user_id: int) -> Optional[dict]: pass
 
+    @abstractmethod
+    async def get_user_session(self, user_id: int) -> Optional[Dict]: pass
+
     @abstractmethod
     async def set_name(self, user_id: int, new_name: str): pass
 
@@ -33,6 +77,9 @@ class AbstractDatabase(ABC):
     @abstractmethod
     async def toggle_task(self, user_id: int, task_id: int) -> bool: pass
 
+    @abstractmethod
+    async def toggle_task_with_state(self, user_id: int, task_id: int) -> Tuple[bool, Set[int]]: pass
+
     @abstractmethod
     async def get_today_stats(self, user_id: int) -> dict: pass
     
@@ -49,7 +96,31 @@ class AbstractDatabase(ABC):
     async def get_tandem_summary(self, tandem_id: int) -> Dict: pass
 
     @abstractmethod
-    async def reset_daily_stats(self): pass
+    async def get_leaderboard(self, offset: int = 0, limit: int = 50) -> List[Dict]: pass
+
+    @abstractmethod
+    async def get_tandem_rank(self, tandem_id: int) -> Optional[int]: pass
+
+    @abstractmethod
+    async def get_leaderboard_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 20) -> Dict: pass
+
+    @abstractmethod
+    async def get_tasks_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 10) -> Dict: pass
+
+    @abstractmethod
+    async def get_pitstop_links_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 10) -> Dict: pass
+
+    @abstractmethod
+    async def reset_daily_stats(self, timezones: Optional[List[str]] = None): pass
+
+    @abstractmethod
+    async def get_user_timezones(self) -> List[str]: pass
+
+    @abstractmethod
+    async def get_user_timezone(self, user_id: int) -> str: pass
+
+    @abstractmethod
+    async def set_user_timezone(self, user_id: int, timezone: str): pass
 
     @abstractmethod
     async def create_task(self, title: str, description: str, points: int = 1) -> int: pass
@@ -70,13 +141,16 @@ class AbstractDatabase(ABC):
     async def create_scheduled_challenge(self, task_ids: List[int], send_time: datetime, message_text: Optional[str] = None) -> int: pass
 
     @abstractmethod
-    async def get_pending_scheduled_challenges(self) -> List[Dict]: pass
+    async def claim_scheduled_challenges(self, until: Optional[datetime] = None, limit: int = 1, lease_seconds: float = 600.0) -> List[Dict]: pass
 
     @abstractmethod
     async def mark_challenge_sent(self, challenge_id: int): pass
 
     @abstractmethod
-    async def get_pitstop_links(self) -> List[Dict]: pass
+    async def get_pitstop_links(self, active_only: bool = True) -> List[Dict]: pass
+
+    @abstractmethod
+    async def get_pitstop_link(self, link_id: int) -> Optional[Dict]: pass
 
     @abstractmethod
     async def add_pitstop_link(self, title: str, url: str) -> int: pass
@@ -90,264 +164,486 @@ class AbstractDatabase(ABC):
     @abstractmethod
     async def get_tandem_statistics(self, tandem_id: int, days: int = 7) -> Dict: pass
 
+    @abstractmethod
+    async def get_tandems_statistics(self, tandem_ids: List[int], days: int = 7) -> Dict[int, Dict]: pass
+
     @abstractmethod
     async def create_scheduled_message(self, message_type: str, scheduled_time: datetime, target_chat_id: Optional[int] = None, forward_from_message_id: Optional[int] = None, text: Optional[str] = None) -> int: pass
 
     @abstractmethod
-    async def get_pending_scheduled_messages(self) -> List[Dict]: pass
+    async def claim_scheduled_messages(self, until: Optional[datetime] = None, limit: int = 1, lease_seconds: float = 600.0) -> List[Dict]: pass
+
+    @abstractmethod
+    async def get_upcoming_schedules(self) -> List[Dict]: pass
+
+    @abstractmethod
+    async def listen(self, channel: str, callback: Callable[[str], Any]): pass
+
+    @abstractmethod
+    def advisory_lock(self, name: str) -> AsyncContextManager[bool]: pass
+
+    @abstractmethod
+    async def claim_job_run(self, job: str, run_key: str) -> bool: pass
 
     @abstractmethod
     async def mark_message_sent(self, message_id: int): pass
 
     @abstractmethod
-    async def get_users_with_incomplete_tasks(self, task_ids: List[int]) -> List[Dict]: pass
+    async def get_users_with_incomplete_tasks(self, task_ids: List[int], timezones: Optional[List[str]] = None) -> List[Dict]: pass
+
+    @abstractmethod
+    def iter_users_with_incomplete_tasks(self, task_ids: List[int], timezones: Optional[List[str]] = None, chunk_size: int = 1000) -> AsyncIterator[int]: pass
+
+    @abstractmethod
+    async def enqueue_broadcast(self, broadcast_type: str, broadcast_id: int) -> int: pass
+
+    @abstractmethod
+    async def claim_broadcast_batch(self, broadcast_type: str, broadcast_id: int, limit: int, lease_seconds: float) -> List[int]: pass
+
+    @abstractmethod
+    async def record_broadcast_results(self, broadcast_type: str, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]): pass
+
+    @abstractmethod
+    async def get_broadcast_progress(self, broadcast_type: str, broadcast_id: int) -> Dict[str, int]: pass
+
+
+_current_method: ContextVar[str] = ContextVar('db_method', default='other')
 
 
+def _timed(name: str, method: Callable) -> Callable:
+    seconds = DB_METHOD_SECONDS.labels(name)
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _current_method.set(name)
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception as e:
+            DB_METHOD_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - started)
+            _current_method.reset(token)
+    return wrapper
+
+
+def _instrument(cls):
+    # Public coroutines get a latency histogram; queries they run are counted by the pool's query logger
+    for name, member in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.iscoroutinefunction(member):
+            setattr(cls, name, _timed(name, member))
+    return cls
+
+
+def _on_query(record):
+    method = _current_method.get()
+    DB_QUERIES.labels(method).inc()
+    DB_QUERY_SECONDS.labels(method).inc(record.elapsed)
+
+
+@_instrument
 class PostgresService(AbstractDatabase):
-    def __init__(self, dsn: str):
+    def __init__(self, dsn: str, pool_options: Optional[Dict[str, Any]] = None, known_users_limit: int = 100_000, session_cache_size: int = 10_000, session_ttl: float = 300.0, completion_history_months: int = 3, default_timezone: str = DEFAULT_TIMEZONE, maintenance_timeout: float = 600.0):
         self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+        self.pool_options = pool_options or {}
+        self.completion_history_months = completion_history_months
+        self.default_timezone = default_timezone
+        self.maintenance_timeout = maintenance_timeout
         self._pool: Optional[asyncpg.Pool] = None
+        self._known_users = LRUCache(maxsize=known_users_limit)
+        self._sessions = LRUCache(maxsize=session_cache_size, ttl=session_ttl)
+        self._session_generation = 0
+        self._timezones: Optional[List[str]] = None
+        self._skipped_upserts = 0
+        self._instance_id = uuid.uuid4().hex
+        self._listen_conn: Optional[asyncpg.Connection] = None
+        self._listeners: Dict[str, List[Callable[[str], Any]]] = {}
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._catalog_version = 0
+        self._tasks_cache: Optional[List[Dict]] = None
+        self._links_cache: Optional[List[Dict]] = None
+
+    @property
+    def catalog_version(self) -> int:
+        return self._catalog_version
+
+    @property
+    def skipped_upserts(self) -> int:
+        return self._skipped_upserts
 
     async def connect(self):
         try:
-            self._pool = await asyncpg.create_pool(dsn=self.dsn)
+            self._pool = await asyncpg.create_pool(
+                dsn=self.dsn,
+                connection_class=PreparedConnection,
+                init=self._init_connection,
+                **self.pool_options
+            )
             logger.info("Успешное подключение к БД")
+            register_pool_gauges(lambda: self._pool)
         except Exception as e:
             logger.error(f"Ошибка подключения к БД: {e}")
             raise
+        await self._connect_listener()
+        await self.listen(CATALOG_CHANNEL, self._on_catalog_notification)
+        await self.listen(SESSION_CHANNEL, self._on_session_notification)
+
+    @property
+    def pool(self) -> Optional[asyncpg.Pool]:
+        return self._pool
+
+    async def _init_connection(self, conn: PreparedConnection):
+        await conn.warm_statements()
+        conn.add_query_logger(_on_query)
 
     async def disconnect(self):
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._listen_conn:
+            await self._listen_conn.close()
+            self._listen_conn = None
         if self._pool:
             await self._pool.close()
 
-    async def create_default_tables(self):
+    async def listen(self, channel: str, callback: Callable[[str], Any]):
+        if channel not in self._listeners and self._listen_conn:
+            await self._listen_conn.add_listener(channel, self._dispatch_notification)
+        self._listeners.setdefault(channel, []).append(callback)
+
+    async def _connect_listener(self):
+        self._listen_conn = await asyncpg.connect(dsn=self.dsn)
+        self._listen_conn.add_termination_listener(self._on_listener_terminated)
+        for channel in self._listeners:
+            await self._listen_conn.add_listener(channel, self._dispatch_notification)
+
+    def _dispatch_notification(self, connection, pid: int, channel: str, payload: str):
+        for callback in self._listeners.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработки уведомления {channel}: {e}")
+
+    def _on_listener_terminated(self, connection):
+        if self._listen_conn is not connection:
+            return
+        logger.warning("Соединение LISTEN потеряно, переподключаюсь")
+        self._listen_conn = None
+        self._invalidate_catalog()
+        self._clear_sessions()
+        self._reconnect_task = asyncio.ensure_future(self._reconnect_listener())
+
+    async def _reconnect_listener(self):
+        delay = 1
+        while self._listen_conn is None:
+            try:
+                await self._connect_listener()
+                self._invalidate_catalog()
+                self._clear_sessions()
+                logger.info("Соединение LISTEN восстановлено")
+            except Exception as e:
+                logger.error(f"Не удалось восстановить LISTEN: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def _on_catalog_notification(self, payload: str):
+        if payload != self._instance_id:
+            self._invalidate_catalog()
+
+    def _invalidate_catalog(self):
+        self._catalog_version += 1
+        self._tasks_cache = None
+        self._links_cache = None
+
+    @asynccontextmanager
+    async def _catalog_transaction(self):
         async with self._pool.acquire() as conn:
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tandems (
-                id SERIAL PRIMARY KEY,
-                name TEXT DEFAULT 'Тандем',
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                name TEXT DEFAULT 'Безымянный пользователь',
-                tandem_id INTEGER REFERENCES tandems(id) ON DELETE SET NULL,
-                score INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS daily_stats (
-                user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
-                last_updated DATE DEFAULT CURRENT_DATE
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                description TEXT,
-                points INTEGER DEFAULT 1,
-                active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS task_completions (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
-                completed_date DATE DEFAULT CURRENT_DATE,
-                UNIQUE(user_id, task_id, completed_date)
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS scheduled_challenges (
-                id SERIAL PRIMARY KEY,
-                task_ids INTEGER[] NOT NULL,
-                message_text TEXT,
-                send_time TIMESTAMP NOT NULL,
-                sent BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS pitstop_links (
-                id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                url TEXT NOT NULL,
-                active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT NOW()
-            )
-            ''')
-
-            await conn.execute('''
-            CREATE TABLE IF NOT EXISTS scheduled_messages (
-                id SERIAL PRIMARY KEY,
-                message_type TEXT NOT NULL,
-                scheduled_time TIMESTAMP NOT NULL,
-                target_chat_id BIGINT,
-                forward_from_message_id INTEGER,
-                text TEXT,
-                sent BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT NOW()
+            async with conn.transaction():
+                yield conn
+                await conn.execute('SELECT pg_notify($1, $2)', CATALOG_CHANNEL, self._instance_id)
+        self._invalidate_catalog()
+
+    @asynccontextmanager
+    async def _maintenance(self, conn: asyncpg.Connection):
+        # Full-table maintenance may legitimately outlive the pool-wide statement_timeout
+        async with conn.transaction():
+            await conn.execute("SELECT set_config('statement_timeout', $1, true)", str(int(self.maintenance_timeout * 1000)))
+            yield conn
+
+    async def _load_tasks(self) -> List[Dict]:
+        if self._tasks_cache is None:
+            version = self._catalog_version
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch_prepared('load_tasks')
+            tasks = [dict(row) for row in rows]
+            if version != self._catalog_version:
+                return tasks
+            self._tasks_cache = tasks
+        return self._tasks_cache
+
+    async def _load_links(self) -> List[Dict]:
+        if self._links_cache is None:
+            version = self._catalog_version
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch_prepared('load_links')
+            links = [dict(row) for row in rows]
+            if version != self._catalog_version:
+                return links
+            self._links_cache = links
+        return self._links_cache
+
+    async def migrate(self):
+        # Runs on its own connection before the pool exists, so new connections warm against the current schema
+        conn = await asyncpg.connect(dsn=self.dsn)
+        try:
+            applied = await apply_migrations(conn, load_migrations())
+            if applied:
+                await self._partition_default_completions(conn)
+                await self._ensure_completion_partitions(conn, local_today(LATEST_TIMEZONE))
+        finally:
+            await conn.close()
+
+    async def _partition_default_completions(self, conn: asyncpg.Connection):
+        months = await conn.fetch("SELECT DISTINCT date_trunc('month', completed_date)::date AS month FROM task_completions_default")
+        for row in sorted(months, key=lambda row: row['month']):
+            await self._ensure_completion_partition(conn, row['month'])
+
+    async def _ensure_completion_partitions(self, conn: asyncpg.Connection, today: date):
+        month = _month_start(today)
+        await self._ensure_completion_partition(conn, month)
+        await self._ensure_completion_partition(conn, _add_months(month, 1))
+
+    async def _ensure_completion_partition(self, conn: asyncpg.Connection, month: date):
+        name = _partition_name(month)
+        if await conn.fetchval('SELECT to_regclass($1)', name):
+            return
+        end = _add_months(month, 1)
+        async with self._maintenance(conn):
+            await conn.execute(f'CREATE TABLE {name} (LIKE task_completions INCLUDING DEFAULTS)')
+            await conn.execute(f'''
+                WITH moved AS (
+                    DELETE FROM task_completions_default
+                    WHERE completed_date >= $1 AND completed_date < $2
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            ''', month, end, timeout=self.maintenance_timeout)
+            await conn.execute(
+                f"ALTER TABLE task_completions ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')",
+                timeout=self.maintenance_timeout
             )
-            ''')
-
-            await conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_task_completions_user_date 
-            ON task_completions(user_id, completed_date)
-            ''')
-
-            await conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_scheduled_challenges_time 
-            ON scheduled_challenges(send_time) WHERE sent = FALSE
-            ''')
+        logger.info(f"Создана секция {name}")
+
+    async def _drop_old_completion_partitions(self, conn: asyncpg.Connection, today: date):
+        cutoff_month = _add_months(_month_start(today), -self.completion_history_months)
+        cutoff = _partition_name(cutoff_month)
+        partitions = await conn.fetch('''
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'task_completions'::regclass AND c.relname ~ '^task_completions_p[0-9]{6}$'
+        ''')
+        async with self._maintenance(conn):
+            for name in sorted(row['relname'] for row in partitions):
+                if name >= cutoff:
+                    break
+                await conn.execute(f'DROP TABLE {name}', timeout=self.maintenance_timeout)
+                logger.info(f"Удалена устаревшая секция {name}")
+            await conn.execute('DELETE FROM task_completions_default WHERE completed_date < $1', cutoff_month, timeout=self.maintenance_timeout)
+
+    async def _rollup_completions(self, conn: asyncpg.Connection, today: date) -> int:
+        last_day = await conn.fetchval('SELECT MAX(day) FROM daily_completion_rollups')
+        if last_day is not None:
+            first_day = last_day + timedelta(days=1)
+        else:
+            first_day = await conn.fetchval('SELECT MIN(completed_date) FROM task_completions')
+        if first_day is None or first_day >= today:
+            return 0
+        result = await conn.execute('''
+            INSERT INTO daily_completion_rollups (day, user_id, tandem_id, completions, points)
+            SELECT tc.completed_date, tc.user_id, u.tandem_id, COUNT(*), COALESCE(SUM(t.points), 0)
+            FROM task_completions tc
+            JOIN users u ON u.user_id = tc.user_id
+            LEFT JOIN tasks t ON t.id = tc.task_id
+            WHERE tc.completed_date >= $1 AND tc.completed_date < $2
+            GROUP BY tc.completed_date, tc.user_id, u.tandem_id
+            ON CONFLICT (day, user_id) DO UPDATE
+            SET tandem_id = EXCLUDED.tandem_id,
+                completions = EXCLUDED.completions,
+                points = EXCLUDED.points
+        ''', first_day, today, timeout=self.maintenance_timeout)
+        return int(result.split()[-1])
+
+    async def load_known_users(self):
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT u.user_id FROM users u
+                JOIN daily_stats d ON d.user_id = u.user_id
+                ORDER BY u.created_at DESC
+                LIMIT $1
+            ''', self._known_users.maxsize)
+        for row in reversed(rows):
+            self._known_users.set(row['user_id'], True)
+        logger.info(f"Загружено известных пользователей: {len(rows)}")
+
+    async def _ensure_users(self, conn: asyncpg.Connection, *user_ids: int):
+        for user_id in user_ids:
+            if user_id in self._known_users:
+                self._skipped_upserts += 2
+                continue
+            await conn.execute('INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
+            await conn.execute('INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
 
-            await conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_scheduled_messages_time 
-            ON scheduled_messages(scheduled_time) WHERE sent = FALSE
-            ''')
+    def _remember_users(self, *user_ids: int):
+        for user_id in user_ids:
+            self._known_users.set(user_id, True)
 
     async def register_user(self, user_id: int):
+        if user_id in self._known_users:
+            self._skipped_upserts += 2
+            return
         async with self._pool.acquire() as conn:
-            await conn.execute(
-                'INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', 
-                user_id
-            )
-            await conn.execute(
-                'INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', 
-                user_id
-            )
+            await self._ensure_users(conn, user_id)
+        self._remember_users(user_id)
+        self._sessions.pop(user_id)
 
     async def get_user_info(self, user_id: int) -> Optional[dict]:
         async with self._pool.acquire() as conn:
             row = await conn.fetchrow('SELECT * FROM users WHERE user_id = $1', user_id)
             return dict(row) if row else None
 
+    async def get_user_session(self, user_id: int) -> Optional[Dict]:
+        session = self._sessions.get(user_id)
+        if session is not None:
+            return session
+        # Any invalidation during the fetch may concern this row, so it is then returned but not cached
+        generation = self._session_generation
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow_prepared('user_session', user_id)
+        if not row:
+            return None
+        session = dict(row)
+        if self._session_generation == generation:
+            self._sessions.set(user_id, session)
+        return session
+
+    async def _sessions_changed(self, conn: asyncpg.Connection, user_ids: List[int]):
+        self._invalidate_sessions(user_ids)
+        if user_ids:
+            payload = self._instance_id + ':' + ','.join(map(str, user_ids))
+            await conn.execute('SELECT pg_notify($1, $2)', SESSION_CHANNEL, payload)
+
+    def _on_session_notification(self, payload: str):
+        instance_id, _, user_ids = payload.partition(':')
+        if instance_id != self._instance_id:
+            self._invalidate_sessions([int(user_id) for user_id in user_ids.split(',') if user_id])
+
+    def _invalidate_sessions(self, user_ids: List[int]):
+        self._session_generation += 1
+        self._timezones = None
+        for user_id in user_ids:
+            self._sessions.pop(user_id)
+
+    def _clear_sessions(self):
+        self._session_generation += 1
+        self._timezones = None
+        self._sessions.clear()
+
     async def set_name(self, user_id: int, new_name: str):
         async with self._pool.acquire() as conn:
-            await conn.execute('UPDATE users SET name = $1 WHERE user_id = $2', new_name, user_id)
+            rows = await conn.fetch('''
+                WITH updated AS (
+                    UPDATE users SET name = $1 WHERE user_id = $2 RETURNING tandem_id
+                )
+                SELECT user_id FROM users WHERE tandem_id = (SELECT tandem_id FROM updated)
+            ''', new_name, user_id)
+            await self._sessions_changed(conn, list({user_id, *(row['user_id'] for row in rows)}))
 
     async def create_tandem(self, user_id: int, partner_id: int) -> int:
         async with self._pool.acquire() as conn:
             async with conn.transaction(): 
-                await conn.execute('INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-                await conn.execute('INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', partner_id)
-                await conn.execute('INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-                await conn.execute('INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', partner_id)
+                await self._ensure_users(conn, user_id, partner_id)
                 tandem_id = await conn.fetchval('INSERT INTO tandems DEFAULT VALUES RETURNING id')
                 await conn.execute('UPDATE users SET tandem_id = $1 WHERE user_id IN ($2, $3)', 
                                    tandem_id, user_id, partner_id)
-                return tandem_id
+                await conn.execute(
+                    'INSERT INTO tandem_scores (tandem_id, score) '
+                    'SELECT $1, COALESCE(SUM(score), 0) FROM users WHERE tandem_id = $1',
+                    tandem_id
+                )
+            await self._sessions_changed(conn, [user_id, partner_id])
+        self._remember_users(user_id, partner_id)
+        return tandem_id
 
     async def set_tandem_name(self, tandem_id: int, new_name: str):
         async with self._pool.acquire() as conn:
-            await conn.execute('UPDATE tandems SET name = $1 WHERE id = $2', new_name, tandem_id)
+            rows = await conn.fetch('''
+                WITH updated AS (
+                    UPDATE tandems SET name = $1 WHERE id = $2
+                )
+                SELECT user_id FROM users WHERE tandem_id = $2
+            ''', new_name, tandem_id)
+            await self._sessions_changed(conn, [row['user_id'] for row in rows])
             
     async def get_partner_id(self, user_id: int) -> Optional[int]:
-        async with self._pool.acquire() as conn:
-            tandem_id = await conn.fetchval('SELECT tandem_id FROM users WHERE user_id = $1', user_id)
-            if not tandem_id:
-                return None
-            return await conn.fetchval('SELECT user_id FROM users WHERE tandem_id = $1 AND user_id != $2', 
-                                         tandem_id, user_id)
+        session = await self.get_user_session(user_id)
+        return session['partner_id'] if session else None
 
     async def get_tandem_info(self, user_id: int) -> Optional[Dict]:
-        async with self._pool.acquire() as conn:
-            query = """
-                SELECT t.id as tandem_id, t.name as tandem_name, 
-                        u2.name as partner_name, u2.user_id as partner_id, u1.name as name
-                FROM users u1
-                JOIN tandems t ON u1.tandem_id = t.id
-                JOIN users u2 ON u2.tandem_id = t.id AND u2.user_id != u1.user_id
-                WHERE u1.user_id = $1
-            """
-            row = await conn.fetchrow(query, user_id)
-            return dict(row) if row else None
+        session = await self.get_user_session(user_id)
+        if not session or session['partner_id'] is None:
+            return None
+        return {
+            'tandem_id': session['tandem_id'],
+            'tandem_name': session['tandem_name'],
+            'partner_name': session['partner_name'],
+            'partner_id': session['partner_id'],
+            'name': session['name'],
+        }
 
     async def disband_tandem(self, user_id: int):
         async with self._pool.acquire() as conn:
-            tandem_id = await conn.fetchval('SELECT tandem_id FROM users WHERE user_id = $1', user_id)
-            if tandem_id:
-                await conn.execute('DELETE FROM tandems WHERE id = $1', tandem_id)
-
-    async def toggle_task(self, user_id: int, task_id: int) -> bool:
-        async with self._pool.acquire() as conn:
-            async with conn.transaction():
-                await conn.execute('INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-                await conn.execute('INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-                
-                task = await conn.fetchrow('SELECT id, points FROM tasks WHERE id = $1 AND active = TRUE', task_id)
-                if not task:
-                    logger.warning(f"Попытка переключить несуществующую задачу: {task_id}")
-                    return False
-
-                today = date.today()
-                existing = await conn.fetchrow(
-                    'SELECT id FROM task_completions WHERE user_id = $1 AND task_id = $2 AND completed_date = $3',
-                    user_id, task_id, today
+            rows = await conn.fetch('''
+                WITH tandem AS (
+                    SELECT tandem_id AS id FROM users WHERE user_id = $1 AND tandem_id IS NOT NULL
+                ),
+                deleted AS (
+                    DELETE FROM tandems WHERE id = (SELECT id FROM tandem)
                 )
+                SELECT user_id FROM users WHERE tandem_id = (SELECT id FROM tandem)
+            ''', user_id)
+            await self._sessions_changed(conn, list({user_id, *(row['user_id'] for row in rows)}))
 
-                if existing:
-                    await conn.execute(
-                        'DELETE FROM task_completions WHERE id = $1',
-                        existing['id']
-                    )
-                    await conn.execute(
-                        'UPDATE users SET score = GREATEST(score - $1, 0) WHERE user_id = $2',
-                        task['points'], user_id
-                    )
-                    await conn.execute(
-                        'UPDATE daily_stats SET last_updated = $1 WHERE user_id = $2',
-                        today, user_id
-                    )
-                    return False
-                else:
-                    await conn.execute(
-                        'INSERT INTO task_completions (user_id, task_id, completed_date) VALUES ($1, $2, $3)',
-                        user_id, task_id, today
-                    )
-                    await conn.execute(
-                        'UPDATE users SET score = score + $1 WHERE user_id = $2',
-                        task['points'], user_id
-                    )
-                    await conn.execute(
-                        'UPDATE daily_stats SET last_updated = $1 WHERE user_id = $2',
-                        today, user_id
-                    )
-                    return True
+    async def toggle_task(self, user_id: int, task_id: int) -> bool:
+        completed, _ = await self.toggle_task_with_state(user_id, task_id)
+        return completed
+
+    async def toggle_task_with_state(self, user_id: int, task_id: int) -> Tuple[bool, Set[int]]:
+        today = local_today(await self.get_user_timezone(user_id))
+        async with self._pool.acquire() as conn, conn.transaction():
+            # Two quick taps serialise on the user row; the toggle then reads the other tap's result
+            await conn.execute_prepared('lock_member', user_id)
+            row = await conn.fetchrow_prepared('toggle_task', user_id, task_id, today)
+        # The statement writes users/daily_stats only with the score change itself; the two
+        # existence upserts every toggle used to run first are gone
+        self._skipped_upserts += 2
+
+        if not row['task_found']:
+            logger.warning(f"Попытка переключить несуществующую задачу: {task_id}")
+        return row['completed'], set(row['completed_ids'])
 
     async def get_today_stats(self, user_id: int) -> dict:
+        active_tasks = await self.get_all_tasks(active_only=True)
+        today = local_today(await self.get_user_timezone(user_id))
         async with self._pool.acquire() as conn:
-            await conn.execute('INSERT INTO users (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-            await conn.execute('INSERT INTO daily_stats (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING', user_id)
-            
-            today = date.today()
-            active_tasks = await conn.fetch('SELECT id, title FROM tasks WHERE active = TRUE ORDER BY id')
-            completions = await conn.fetch(
-                'SELECT task_id FROM task_completions WHERE user_id = $1 AND completed_date = $2',
-                user_id, today
-            )
-            completed_ids = {row['task_id'] for row in completions}
-            
-            return {str(task['id']): task['id'] in completed_ids for task in active_tasks}
+            completions = await conn.fetch_prepared('today_completions', user_id, today)
+        completed_ids = {row['task_id'] for row in completions}
+        
+        return {str(task['id']): task['id'] in completed_ids for task in active_tasks}
 
     async def get_tandem_score_breakdown(self, tandem_id: int) -> Dict[int, int]:
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT user_id, score 
-                FROM users 
-                WHERE tandem_id = $1
-            ''', tandem_id)
+            rows = await conn.fetch_prepared('tandem_score_breakdown', tandem_id)
             return {row['user_id']: row['score'] for row in rows}
 
     async def get_all_users(self, in_tandem: Optional[bool] = None) -> List[int]:
@@ -382,89 +678,119 @@ class PostgresService(AbstractDatabase):
                 return {'total_score': 0, 'user_names': []}
             return {'total_score': row['total_score'], 'user_names': row['user_names']}
 
-    async def get_all_tandems_with_summary(self) -> List[Dict]:
+    async def get_leaderboard(self, offset: int = 0, limit: int = 50) -> List[Dict]:
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT 
-                    t.id,
-                    t.name,
-                    COALESCE(SUM(u.score), 0) AS total_score,
-                    array_agg(u.name) FILTER (WHERE u.name IS NOT NULL) AS user_names
-                FROM tandems t
-                LEFT JOIN users u ON u.tandem_id = t.id
-                GROUP BY t.id, t.name
-                ORDER BY total_score DESC
-            ''')
+            rows = await conn.fetch_prepared('leaderboard', offset, limit)
             return [dict(row) for row in rows]
 
-    async def reset_daily_stats(self):
-        async with self._pool.acquire() as conn:
-            await conn.execute('''
-                UPDATE daily_stats 
-                SET last_updated = CURRENT_DATE
-                WHERE last_updated < CURRENT_DATE
-            ''')
-            await conn.execute('''
-                DELETE FROM task_completions 
-                WHERE completed_date < CURRENT_DATE
-            ''')
-            logger.info("Ежедневная статистика сброшена")
+    async def get_tandem_rank(self, tandem_id: int) -> Optional[int]:
+        async with self._pool.acquire() as conn:
+            return await conn.fetchval_prepared('tandem_rank', tandem_id)
+
+    async def _keyset_fetch(self, name: str, cursor: Optional[Cursor], start: Cursor, backward: bool, limit: int) -> Tuple[List[Dict], bool, bool]:
+        async with self._pool.acquire() as conn:
+            if backward and cursor:
+                rows = await conn.fetch_prepared(f'{name}_before', *cursor, limit + 1)
+                return [dict(row) for row in rows[:limit]][::-1], len(rows) > limit, True
+            rows = await conn.fetch_prepared(f'{name}_after', *(cursor or start), limit + 1)
+            return [dict(row) for row in rows[:limit]], cursor is not None, len(rows) > limit
+
+    async def get_leaderboard_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 20) -> Dict:
+        key, rank = (cursor[:2], cursor[2]) if cursor else (None, 0)
+        items, has_prev, has_next = await self._keyset_fetch('leaderboard', key, LEADERBOARD_START, backward, limit)
+        first_rank = rank - len(items) if backward and cursor else rank + 1
+        for i, item in enumerate(items):
+            item['rank'] = first_rank + i
+        return {
+            'items': items,
+            'prev': (items[0]['total_score'], items[0]['id'], items[0]['rank']) if has_prev and items else None,
+            'next': (items[-1]['total_score'], items[-1]['id'], items[-1]['rank']) if has_next and items else None,
+        }
+
+    async def get_tasks_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 10) -> Dict:
+        return await self._id_page('tasks', cursor, backward, limit)
+
+    async def get_pitstop_links_page(self, cursor: Optional[Cursor] = None, backward: bool = False, limit: int = 10) -> Dict:
+        return await self._id_page('links', cursor, backward, limit)
+
+    async def _id_page(self, name: str, cursor: Optional[Cursor], backward: bool, limit: int) -> Dict:
+        version = self._catalog_version
+        items, has_prev, has_next = await self._keyset_fetch(name, cursor, (0,), backward, limit)
+        return {
+            'version': version,
+            'items': items,
+            'prev': (items[0]['id'],) if has_prev and items else None,
+            'next': (items[-1]['id'],) if has_next and items else None,
+        }
+
+    async def reset_daily_stats(self, timezones: Optional[List[str]] = None):
+        # A day is closed only once it has ended in every time zone
+        closed_before = local_today(EARLIEST_TIMEZONE)
+        async with self._pool.acquire() as conn:
+            async with self._maintenance(conn):
+                result = await conn.execute_prepared('rollover_users', self.default_timezone, timezones, timeout=self.maintenance_timeout)
+            async with self._maintenance(conn):
+                rolled_up = await self._rollup_completions(conn, closed_before)
+            await self._ensure_completion_partitions(conn, local_today(LATEST_TIMEZONE))
+            await self._drop_old_completion_partitions(conn, closed_before)
+            await conn.execute("DELETE FROM scheduler_runs WHERE claimed_at < NOW() - INTERVAL '7 days'")
+        logger.info(
+            f"Ежедневная статистика сброшена ({', '.join(timezones) if timezones is not None else 'все пояса'}): "
+            f"пользователей {result.split()[-1]}, свернуто строк: {rolled_up}"
+        )
+
+    async def get_user_timezones(self) -> List[str]:
+        # Every 15-minute wave asks for this; the set only changes with a session change (its own
+        # NOTIFY drops it), so the full scan of users runs after those instead of on every wave
+        if self._timezones is None:
+            generation = self._session_generation
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch_prepared('user_timezones', self.default_timezone)
+            # New users start in the default zone, which may not be in the table yet
+            timezones = sorted({self.default_timezone, *(row['timezone'] for row in rows)})
+            if self._session_generation != generation:
+                return timezones
+            self._timezones = timezones
+        return list(self._timezones)
+
+    async def get_user_timezone(self, user_id: int) -> str:
+        session = await self.get_user_session(user_id)
+        return (session and session['timezone']) or self.default_timezone
+
+    async def set_user_timezone(self, user_id: int, timezone: str):
+        async with self._pool.acquire() as conn:
+            await self._ensure_users(conn, user_id)
+            await conn.execute('UPDATE users SET timezone = $1 WHERE user_id = $2', timezone, user_id)
+            await self._sessions_changed(conn, [user_id])
+        self._remember_users(user_id)
 
     async def create_task(self, title: str, description: str, points: int = 1) -> int:
-        async with self._pool.acquire() as conn:
+        async with self._catalog_transaction() as conn:
             task_id = await conn.fetchval(
                 'INSERT INTO tasks (title, description, points) VALUES ($1, $2, $3) RETURNING id',
                 title, description, points
             )
-            return task_id
+        return task_id
 
     async def get_all_tasks(self, active_only: bool = True) -> List[Dict]:
-        async with self._pool.acquire() as conn:
-            query = 'SELECT id, title, description, points, active, created_at FROM tasks'
-            if active_only:
-                query += ' WHERE active = TRUE'
-            query += ' ORDER BY id'
-            rows = await conn.fetch(query)
-            return [dict(row) for row in rows]
+        tasks = await self._load_tasks()
+        if active_only:
+            return [task for task in tasks if task['active']]
+        return list(tasks)
 
     async def update_task(self, task_id: int, title: Optional[str] = None, description: Optional[str] = None, points: Optional[int] = None, active: Optional[bool] = None):
-        async with self._pool.acquire() as conn:
-            updates = []
-            params = []
-            param_num = 1
-            
-            if title is not None:
-                updates.append(f'title = ${param_num}')
-                params.append(title)
-                param_num += 1
-            if description is not None:
-                updates.append(f'description = ${param_num}')
-                params.append(description)
-                param_num += 1
-            if points is not None:
-                updates.append(f'points = ${param_num}')
-                params.append(points)
-                param_num += 1
-            if active is not None:
-                updates.append(f'active = ${param_num}')
-                params.append(active)
-                param_num += 1
-            
-            if updates:
-                params.append(task_id)
-                await conn.execute(
-                    f'UPDATE tasks SET {", ".join(updates)} WHERE id = ${param_num}',
-                    *params
-                )
+        if title is None and description is None and points is None and active is None:
+            return
+        async with self._catalog_transaction() as conn:
+            await conn.execute_prepared('update_task', task_id, title, description, points, active)
 
     async def delete_task(self, task_id: int):
-        async with self._pool.acquire() as conn:
+        async with self._catalog_transaction() as conn:
             await conn.execute('UPDATE tasks SET active = FALSE WHERE id = $1', task_id)
 
     async def get_task(self, task_id: int) -> Optional[Dict]:
-        async with self._pool.acquire() as conn:
-            row = await conn.fetchrow('SELECT * FROM tasks WHERE id = $1', task_id)
-            return dict(row) if row else None
+        tasks = await self._load_tasks()
+        return next((task for task in tasks if task['id'] == task_id), None)
 
     async def create_scheduled_challenge(self, task_ids: List[int], send_time: datetime, message_text: Optional[str] = None) -> int:
         async with self._pool.acquire() as conn:
@@ -472,13 +798,15 @@ class PostgresService(AbstractDatabase):
                 'INSERT INTO scheduled_challenges (task_ids, send_time, message_text) VALUES ($1, $2, $3) RETURNING id',
                 task_ids, send_time, message_text
             )
+            await self._schedule_changed(conn, 'challenge', challenge_id, send_time)
             return challenge_id
 
-    async def get_pending_scheduled_challenges(self) -> List[Dict]:
+    async def _schedule_changed(self, conn: asyncpg.Connection, kind: str, schedule_id: int, run_at: datetime):
+        await conn.execute('SELECT pg_notify($1, $2)', SCHEDULE_CHANNEL, f'{kind}:{schedule_id}:{run_at.isoformat()}')
+
+    async def claim_scheduled_challenges(self, until: Optional[datetime] = None, limit: int = 1, lease_seconds: float = 600.0) -> List[Dict]:
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch(
-                'SELECT * FROM scheduled_challenges WHERE sent = FALSE AND send_time <= NOW() ORDER BY send_time'
-            )
+            rows = await conn.fetch_prepared('claim_challenges', until or datetime.now(), lease_seconds, limit)
             return [dict(row) for row in rows]
 
     async def mark_challenge_sent(self, challenge_id: int):
@@ -486,96 +814,54 @@ class PostgresService(AbstractDatabase):
             await conn.execute('UPDATE scheduled_challenges SET sent = TRUE WHERE id = $1', challenge_id)
 
     async def get_pitstop_links(self, active_only: bool = True) -> List[Dict]:
-        async with self._pool.acquire() as conn:
-            query = 'SELECT * FROM pitstop_links'
-            if active_only:
-                query += ' WHERE active = TRUE'
-            query += ' ORDER BY id'
-            rows = await conn.fetch(query)
-            return [dict(row) for row in rows]
+        links = await self._load_links()
+        if active_only:
+            return [link for link in links if link['active']]
+        return list(links)
+
+    async def get_pitstop_link(self, link_id: int) -> Optional[Dict]:
+        links = await self._load_links()
+        return next((link for link in links if link['id'] == link_id), None)
 
     async def add_pitstop_link(self, title: str, url: str) -> int:
-        async with self._pool.acquire() as conn:
+        async with self._catalog_transaction() as conn:
             link_id = await conn.fetchval(
                 'INSERT INTO pitstop_links (title, url) VALUES ($1, $2) RETURNING id',
                 title, url
             )
-            return link_id
+        return link_id
 
     async def update_pitstop_link(self, link_id: int, title: Optional[str] = None, url: Optional[str] = None):
-        async with self._pool.acquire() as conn:
-            updates = []
-            params = []
-            param_num = 1
-            
-            if title is not None:
-                updates.append(f'title = ${param_num}')
-                params.append(title)
-                param_num += 1
-            if url is not None:
-                updates.append(f'url = ${param_num}')
-                params.append(url)
-                param_num += 1
-            
-            if updates:
-                params.append(link_id)
-                await conn.execute(
-                    f'UPDATE pitstop_links SET {", ".join(updates)} WHERE id = ${param_num}',
-                    *params
-                )
+        if title is None and url is None:
+            return
+        async with self._catalog_transaction() as conn:
+            await conn.execute_prepared('update_pitstop_link', link_id, title, url)
 
     async def delete_pitstop_link(self, link_id: int):
-        async with self._pool.acquire() as conn:
+        async with self._catalog_transaction() as conn:
             await conn.execute('UPDATE pitstop_links SET active = FALSE WHERE id = $1', link_id)
 
     async def get_tandem_statistics(self, tandem_id: int, days: int = 7) -> Dict:
+        stats = await self.get_tandems_statistics([tandem_id], days)
+        return stats.get(tandem_id, {'total_score': 0, 'completions_by_day': {}, 'tasks_completed': 0, 'user_names': []})
+
+    async def get_tandems_statistics(self, tandem_ids: List[int], days: int = 7) -> Dict[int, Dict]:
+        if not tandem_ids:
+            return {}
+        since = local_today(self.default_timezone) - timedelta(days=days)
         async with self._pool.acquire() as conn:
-            user_ids = await conn.fetch(
-                'SELECT user_id FROM users WHERE tandem_id = $1',
-                tandem_id
-            )
-            if not user_ids:
-                return {'total_score': 0, 'completions_by_day': {}, 'tasks_completed': 0}
-            
-            user_id_list = [row['user_id'] for row in user_ids]
-            
-            total_score_row = await conn.fetchrow(
-                'SELECT SUM(score) as total FROM users WHERE user_id = ANY($1)',
-                user_id_list
-            )
-            total_score = total_score_row['total'] or 0
-            
-            completions = await conn.fetch(
-                '''
-                SELECT 
-                    completed_date,
-                    COUNT(*) as count
-                FROM task_completions
-                WHERE user_id = ANY($1) 
-                    AND completed_date >= CURRENT_DATE - $2::INTERVAL
-                GROUP BY completed_date
-                ORDER BY completed_date
-                ''',
-                user_id_list, f'{days} days'
-            )
-            
-            completions_by_day = {str(row['completed_date']): row['count'] for row in completions}
-            
-            total_completions = await conn.fetchval(
-                '''
-                SELECT COUNT(*) 
-                FROM task_completions 
-                WHERE user_id = ANY($1) 
-                    AND completed_date >= CURRENT_DATE - $2::INTERVAL
-                ''',
-                user_id_list, f'{days} days'
-            )
-            
-            return {
-                'total_score': total_score,
+            rows = await conn.fetch_prepared('tandems_statistics', list(tandem_ids), since)
+
+        stats = {}
+        for row in rows:
+            completions_by_day = {str(day): count for day, count in zip(row['days'], row['counts'])}
+            stats[row['tandem_id']] = {
+                'total_score': row['total_score'],
                 'completions_by_day': completions_by_day,
-                'tasks_completed': total_completions or 0
+                'tasks_completed': sum(completions_by_day.values()),
+                'user_names': list(row['user_names']),
             }
+        return stats
 
     async def create_scheduled_message(self, message_type: str, scheduled_time: datetime, target_chat_id: Optional[int] = None, forward_from_message_id: Optional[int] = None, text: Optional[str] = None) -> int:
         async with self._pool.acquire() as conn:
@@ -583,31 +869,80 @@ class PostgresService(AbstractDatabase):
                 'INSERT INTO scheduled_messages (message_type, scheduled_time, target_chat_id, forward_from_message_id, text) VALUES ($1, $2, $3, $4, $5) RETURNING id',
                 message_type, scheduled_time, target_chat_id, forward_from_message_id, text
             )
+            await self._schedule_changed(conn, 'message', message_id, scheduled_time)
             return message_id
 
-    async def get_pending_scheduled_messages(self) -> List[Dict]:
+    async def claim_scheduled_messages(self, until: Optional[datetime] = None, limit: int = 1, lease_seconds: float = 600.0) -> List[Dict]:
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch(
-                'SELECT * FROM scheduled_messages WHERE sent = FALSE AND scheduled_time <= NOW() ORDER BY scheduled_time'
-            )
+            rows = await conn.fetch_prepared('claim_messages', until or datetime.now(), lease_seconds, limit)
+            return [dict(row) for row in rows]
+
+    @asynccontextmanager
+    async def advisory_lock(self, name: str):
+        async with self._pool.acquire() as conn:
+            locked = await conn.fetchval('SELECT pg_try_advisory_lock(hashtext($1))', name)
+            try:
+                yield locked
+            finally:
+                if locked:
+                    await conn.execute('SELECT pg_advisory_unlock(hashtext($1))', name)
+
+    async def claim_job_run(self, job: str, run_key: str) -> bool:
+        async with self._pool.acquire() as conn:
+            return bool(await conn.fetchval_prepared('claim_job_run', job, run_key, self._instance_id))
+
+    async def get_upcoming_schedules(self) -> List[Dict]:
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch_prepared('upcoming_schedules')
             return [dict(row) for row in rows]
 
     async def mark_message_sent(self, message_id: int):
         async with self._pool.acquire() as conn:
             await conn.execute('UPDATE scheduled_messages SET sent = TRUE WHERE id = $1', message_id)
 
-    async def get_users_with_incomplete_tasks(self, task_ids: List[int]) -> List[Dict]:
+    async def get_users_with_incomplete_tasks(self, task_ids: List[int], timezones: Optional[List[str]] = None) -> List[Dict]:
         async with self._pool.acquire() as conn:
-            today = date.today()
-            rows = await conn.fetch('''
-                SELECT DISTINCT u.user_id, u.name, u.tandem_id
-                FROM users u
-                WHERE u.tandem_id IS NOT NULL
-                    AND NOT EXISTS (
-                        SELECT 1 FROM task_completions tc
-                        WHERE tc.user_id = u.user_id
-                            AND tc.task_id = ANY($1)
-                            AND tc.completed_date = $2
-                    )
-            ''', task_ids, today)
+            rows = await conn.fetch_prepared('users_with_incomplete_tasks', task_ids, self.default_timezone, timezones)
             return [dict(row) for row in rows]
+
+    async def iter_users_with_incomplete_tasks(self, task_ids: List[int], timezones: Optional[List[str]] = None, chunk_size: int = 1000) -> AsyncIterator[int]:
+        # Keyset pages instead of a cursor: a rate-limited send can take hours, and a cursor would hold
+        # a pool connection and a snapshot (blocking vacuum) for all that time
+        last_id = 0
+        while True:
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch_prepared(
+                    'users_with_incomplete_tasks_page', task_ids, self.default_timezone, timezones, last_id, chunk_size
+                )
+            for row in rows:
+                yield row['user_id']
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]['user_id']
+
+    async def enqueue_broadcast(self, broadcast_type: str, broadcast_id: int) -> int:
+        async with self._pool.acquire() as conn:
+            async with self._maintenance(conn):
+                return await conn.fetchval_prepared('broadcast_enqueue', broadcast_type, broadcast_id, timeout=self.maintenance_timeout)
+
+    async def claim_broadcast_batch(self, broadcast_type: str, broadcast_id: int, limit: int, lease_seconds: float) -> List[int]:
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch_prepared('broadcast_claim', broadcast_type, broadcast_id, limit, lease_seconds)
+            return sorted(row['user_id'] for row in rows)
+
+    async def record_broadcast_results(self, broadcast_type: str, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]):
+        if not results:
+            return
+        user_ids, statuses, errors = zip(*results)
+        async with self._pool.acquire() as conn:
+            await conn.execute_prepared('broadcast_record', broadcast_type, broadcast_id, list(user_ids), list(statuses), list(errors))
+
+    async def get_broadcast_progress(self, broadcast_type: str, broadcast_id: int) -> Dict[str, int]:
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT status, COUNT(*) AS count
+                FROM broadcast_deliveries
+                WHERE broadcast_type = $1 AND broadcast_id = $2
+                GROUP BY status
+            ''', broadcast_type, broadcast_id)
+            return {row['status']: row['count'] for row in rows}
@@ -0,0 +1,137 @@
+import copy
+import json
+import zlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, Token
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import DisabledEventIsolation
+from loguru import logger
+
+from services.database import PostgresService
+
+_PLAIN = b'j'
+_ZLIB = b'z'
+
+_Entry = Tuple[Optional[str], Dict[str, Any]]
+
+
+def encode_data(data: Dict[str, Any], compress_threshold: int = 512) -> Optional[bytes]:
+    if not data:
+        return None
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(raw) >= compress_threshold:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return _ZLIB + packed
+    return _PLAIN + raw
+
+
+def decode_data(blob: Optional[bytes]) -> Dict[str, Any]:
+    if not blob:
+        return {}
+    blob = bytes(blob)
+    payload = blob[1:]
+    if blob[:1] == _ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, db: PostgresService, state_ttl: float = 86400.0, compress_threshold: int = 512):
+        self.db = db
+        self.state_ttl = float(state_ttl)
+        self.compress_threshold = compress_threshold
+        self._local: ContextVar[Optional[Dict[str, _Entry]]] = ContextVar(f'fsm_cache_{id(self)}', default=None)
+
+    @staticmethod
+    def build_key(key: StorageKey) -> str:
+        return ':'.join((
+            str(key.bot_id), str(key.chat_id), str(key.user_id),
+            str(key.thread_id or ''), key.business_connection_id or '', key.destiny,
+        ))
+
+    def begin_update(self) -> Token:
+        return self._local.set({})
+
+    def end_update(self, token: Token):
+        self._local.reset(token)
+
+    def _cache(self) -> Dict[str, _Entry]:
+        cache = self._local.get()
+        return cache if cache is not None else {}
+
+    async def _load(self, key: str) -> _Entry:
+        cache = self._cache()
+        entry = cache.get(key)
+        if entry is None:
+            async with self.db.pool.acquire() as conn:
+                row = await conn.fetchrow_prepared('fsm_get', key)
+            entry = (row['state'], decode_data(row['data'])) if row else (None, {})
+            cache[key] = entry
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db_key = self.build_key(key)
+        value = state.state if isinstance(state, State) else state
+        async with self.db.pool.acquire() as conn:
+            if value is None:
+                await conn.execute_prepared('fsm_clear_state', db_key, self.state_ttl)
+            else:
+                await conn.execute_prepared('fsm_set_state', db_key, value, self.state_ttl)
+        cache = self._cache()
+        if db_key in cache:
+            cache[db_key] = (value, cache[db_key][1])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.build_key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        db_key = self.build_key(key)
+        blob = encode_data(data, self.compress_threshold)
+        async with self.db.pool.acquire() as conn:
+            if blob is None:
+                await conn.execute_prepared('fsm_clear_data', db_key, self.state_ttl)
+            else:
+                await conn.execute_prepared('fsm_set_data', db_key, blob, self.state_ttl)
+        cache = self._cache()
+        if db_key in cache:
+            cache[db_key] = (cache[db_key][0], decode_data(blob))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.build_key(key))
+        # Deep: handlers append to nested lists without set_data, which must not leak into the cached entry
+        return copy.deepcopy(data)
+
+    async def cleanup(self) -> int:
+        async with self.db.pool.acquire() as conn:
+            result = await conn.execute_prepared('fsm_cleanup')
+        removed = int(result.split()[-1])
+        if removed:
+            logger.info(f"Удалено {removed} просроченных FSM-состояний")
+        return removed
+
+    async def close(self) -> None:
+        pass
+
+
+class UpdateCacheIsolation(BaseEventIsolation):
+    # FSMContextMiddleware reads raw_state inside lock(), so the per-update cache has to open here
+    def __init__(self, storage: PostgresStorage, inner: Optional[BaseEventIsolation] = None):
+        self.storage = storage
+        self.inner = inner or DisabledEventIsolation()
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        async with self.inner.lock(key):
+            token = self.storage.begin_update()
+            try:
+                yield
+            finally:
+                self.storage.end_update(token)
+
+    async def close(self) -> None:
+        await self.inner.close()
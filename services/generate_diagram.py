@@ -1,15 +1,26 @@
-import matplotlib.pyplot as plt
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
 
+from loguru import logger
 
-def generate_diagram(tandem_id, completed_challenges, max_challenges=204): #1205 было 27, +4 = 31. Почему-то у них макс балл 30, значит что-то я недобавил
+from services.cache import LRUCache
+
+
+def generate_diagram(completed_challenges: int, max_challenges: int) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    completed_challenges = max(0, min(completed_challenges, max_challenges))
     labels = ['Выполнено', 'Всего челленджей']
-    #print('COMPLETED CHALLENGES ', completed_challenges, '\nMAX_CHALLENGES  ', max_challenges)
     sizes = [completed_challenges, max_challenges - completed_challenges]
     colors = ['#FDCD07', '#2277BC']
     explode = (0.05, 0)
 
-
-    fig, ax = plt.subplots(figsize=(6, 6))
+    fig = Figure(figsize=(6, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
     wedges, texts, autotexts = ax.pie(
         sizes,
         labels=labels,
@@ -21,10 +32,56 @@ def generate_diagram(tandem_id, completed_challenges, max_challenges=204): #1205
         textprops={'fontsize': 10, 'color': 'black'}
     )
 
-
-    ax.set_title('Прогресс по челленджам', fontsize=16, fontweight='bold')
-    plt.setp(autotexts, size=12, weight='bold')
+    ax.set_title('Прогресс за сегодня', fontsize=16, fontweight='bold')
+    for autotext in autotexts:
+        autotext.set_size(12)
+        autotext.set_weight('bold')
     ax.axis('equal')
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def _warm_up():
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure  # noqa: F401
+
+
+class DiagramRenderer:
+    def __init__(self, workers: int = 2, cache_size: int = 256):
+        self.workers = workers
+        self._cache = LRUCache(maxsize=cache_size)
+        self._pending: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+    async def render(self, completed_challenges: int, max_challenges: int) -> bytes:
+        key = (max(0, min(completed_challenges, max_challenges)), max_challenges)
+        png = self._cache.get(key)
+        if png is not None:
+            return png
+
+        future = self._pending.get(key)
+        if future is None:
+            self.start()
+            future = asyncio.get_running_loop().run_in_executor(self._executor, generate_diagram, *key)
+            future.add_done_callback(lambda done: self._on_rendered(key, done))
+            self._pending[key] = future
+        return await asyncio.shield(future)
+
+    def _on_rendered(self, key: Tuple[int, int], future: asyncio.Future):
+        self._pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._cache.set(key, future.result())
 
-    plt.tight_layout()
-    plt.savefig(f'diagrams/{tandem_id}.png')
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info(f"Рендерер диаграмм остановлен (кэш: {self._cache.hits} попаданий, {self._cache.misses} промахов)")
@@ -0,0 +1,78 @@
+from typing import Callable, Iterator, Optional
+
+from aiohttp import web
+from loguru import logger
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+from prometheus_client.aiohttp import make_aiohttp_handler
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+HANDLER_SECONDS = Histogram(
+    'tandem_handler_seconds', 'Время обработки апдейта по хендлерам', ('handler',))
+HANDLER_ERRORS = Counter(
+    'tandem_handler_errors', 'Исключения в хендлерах', ('handler', 'error'))
+
+DB_METHOD_SECONDS = Histogram(
+    'tandem_db_method_seconds', 'Время вызова методов PostgresService', ('method',))
+DB_METHOD_ERRORS = Counter(
+    'tandem_db_method_errors', 'Исключения в методах PostgresService', ('method', 'error'))
+DB_QUERIES = Counter(
+    'tandem_db_queries', 'Запросы к PostgreSQL по методам PostgresService', ('method',))
+DB_QUERY_SECONDS = Counter(
+    'tandem_db_query_seconds', 'Суммарное время запросов к PostgreSQL по методам', ('method',))
+
+JOB_SECONDS = Histogram(
+    'tandem_job_seconds', 'Длительность задач планировщика', ('job',), buckets=JOB_BUCKETS)
+JOB_ERRORS = Counter(
+    'tandem_job_errors', 'Ошибки задач планировщика', ('job', 'error'))
+
+
+class PoolCollector(Collector):
+    # Read at scrape time; nothing is exported until the pool exists
+    def __init__(self, get_pool: Callable[[], Optional[object]]):
+        self.get_pool = get_pool
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        pool = self.get_pool()
+        if pool is None:
+            return
+        size, idle = pool.get_size(), pool.get_idle_size()
+        yield GaugeMetricFamily('tandem_db_pool_size', 'Открытые соединения пула', value=size)
+        yield GaugeMetricFamily('tandem_db_pool_idle', 'Свободные соединения пула', value=idle)
+        yield GaugeMetricFamily('tandem_db_pool_busy', 'Занятые соединения пула', value=size - idle)
+        yield GaugeMetricFamily('tandem_db_pool_max_size', 'Предельный размер пула', value=pool.get_max_size())
+
+
+_pool_collector: Optional[PoolCollector] = None
+
+
+def register_pool_gauges(get_pool: Callable[[], Optional[object]]):
+    global _pool_collector
+    if _pool_collector is None:
+        _pool_collector = PoolCollector(get_pool)
+        REGISTRY.register(_pool_collector)
+    else:
+        _pool_collector.get_pool = get_pool
+
+
+class MetricsServer:
+    def __init__(self, host: str, port: int, registry: CollectorRegistry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', make_aiohttp_handler(self.registry))
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
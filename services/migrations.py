@@ -0,0 +1,77 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import asyncpg
+from loguru import logger
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'migrations'
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+# Shared by every replica: whoever takes it migrates, the rest wait and find the schema current
+MIGRATION_LOCK = 0x74616E64656D
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    )
+'''
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    def __str__(self) -> str:
+        return f'{self.version:04d}_{self.name}'
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for path in sorted(directory.glob('*.sql')):
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            raise ValueError(f"Некорректное имя файла миграции: {path.name}")
+        migrations.append(Migration(int(match[1]), match[2], path.read_text(encoding='utf-8')))
+    for expected, migration in enumerate(migrations, start=1):
+        if migration.version != expected:
+            raise ValueError(f"Миграции должны идти подряд с 0001: ожидалась {expected:04d}, найдена {migration}")
+    return migrations
+
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    try:
+        return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def apply_migrations(conn: asyncpg.Connection, migrations: List[Migration]) -> List[Migration]:
+    latest = migrations[-1].version if migrations else 0
+    current = await get_schema_version(conn)
+    if current >= latest:
+        if current > latest:
+            logger.warning(f"Схема БД версии {current} новее кода (последняя миграция {latest})")
+        return []
+
+    await conn.execute('SELECT pg_advisory_lock($1)', MIGRATION_LOCK)
+    try:
+        await conn.execute(SCHEMA_VERSION_TABLE)
+        # Another replica may have migrated while we waited for the lock
+        current = await get_schema_version(conn)
+        pending = [migration for migration in migrations if migration.version > current]
+        for migration in pending:
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    'INSERT INTO schema_version (version, name) VALUES ($1, $2)',
+                    migration.version, migration.name
+                )
+            logger.info(f"Применена миграция {migration}")
+        return pending
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK)
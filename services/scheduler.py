@@ -1,87 +1,159 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from aiogram import Bot
 from loguru import logger
+from typing import Awaitable, Callable, List, Optional
+from datetime import datetime, time
+import functools
+from time import perf_counter
 
-from services.database import AbstractDatabase
-from handlers.admin import send_scheduled_challenges, send_scheduled_messages
+from services.broadcaster import Broadcaster
+from services.database import AbstractDatabase, SCHEDULE_CHANNEL
+from services.fsm_storage import PostgresStorage
+from services.metrics import JOB_ERRORS, JOB_SECONDS
+from services.timezones import WAVE_MINUTES, wave_start, zones_at
+from handlers.admin import send_scheduled_challenges, send_scheduled_messages, send_reminders
 
+ROLLOVER_TIME = time(0, 0)
+REMINDER_TIME = time(20, 0)
+SCHEDULE_RESYNC_MINUTES = 30
 
+
+def timed_job(name: str, error_message: str) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+    def decorator(job: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        seconds = JOB_SECONDS.labels(name)
+
+        @functools.wraps(job)
+        async def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return await job(*args, **kwargs)
+            except Exception as e:
+                JOB_ERRORS.labels(name, type(e).__name__).inc()
+                logger.error(f"{error_message}: {e}")
+            finally:
+                seconds.observe(perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+async def due_timezones(db_service: AbstractDatabase, at: time) -> List[str]:
+    return zones_at(await db_service.get_user_timezones(), wave_start(), at)
+
+
+@timed_job('reset_daily_stats', "Ошибка сброса статистики")
 async def reset_daily_stats_job(db_service: AbstractDatabase):
-    try:
-        await db_service.reset_daily_stats()
-        logger.info("Ежедневная статистика сброшена")
-    except Exception as e:
-        logger.error(f"Ошибка сброса статистики: {e}")
-
-
-async def send_challenges_job(bot: Bot, db_service: AbstractDatabase):
-    try:
-        await send_scheduled_challenges(bot, db_service)
-        logger.info("Проверка запланированных челленджей выполнена")
-    except Exception as e:
-        logger.error(f"Ошибка отправки челленджей: {e}")
-
-
-async def send_messages_job(bot: Bot, db_service: AbstractDatabase):
-    try:
-        await send_scheduled_messages(bot, db_service)
-        logger.info("Проверка запланированных сообщений выполнена")
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщений: {e}")
-
-
-async def send_reminders_job(bot: Bot, db_service: AbstractDatabase):
-    try:
-        tasks = await db_service.get_all_tasks(active_only=True)
-        if tasks:
-            task_ids = [task['id'] for task in tasks]
-            users_with_incomplete = await db_service.get_users_with_incomplete_tasks(task_ids)
-            
-            for user_data in users_with_incomplete:
-                try:
-                    await bot.send_message(
-                        user_data['user_id'],
-                        "Напоминание: у вас есть невыполненные задачи на сегодня!"
-                    )
-                except Exception:
-                    pass
-            
-            logger.info(f"Напоминания отправлены {len(users_with_incomplete)} пользователям")
-    except Exception as e:
-        logger.error(f"Ошибка отправки напоминаний: {e}")
-
-
-def setup_scheduler(scheduler: AsyncIOScheduler, bot: Bot, db_service: AbstractDatabase):
+    timezones = await due_timezones(db_service, ROLLOVER_TIME)
+    if not timezones:
+        return
+    async with db_service.advisory_lock('reset_daily_stats') as locked:
+        if locked:
+            await db_service.reset_daily_stats(timezones)
+
+
+@timed_job('send_challenges', "Ошибка отправки челленджей")
+async def send_challenges_job(bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster, until: Optional[datetime] = None):
+    await send_scheduled_challenges(bot, db_service, broadcaster, until)
+    logger.info("Проверка запланированных челленджей выполнена")
+
+
+@timed_job('send_messages', "Ошибка отправки сообщений")
+async def send_messages_job(bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster, until: Optional[datetime] = None):
+    await send_scheduled_messages(bot, db_service, broadcaster, until)
+    logger.info("Проверка запланированных сообщений выполнена")
+
+
+SCHEDULE_JOBS = {
+    'challenge': send_challenges_job,
+    'message': send_messages_job,
+}
+
+
+def schedule_delivery(scheduler: AsyncIOScheduler, kind: str, run_at: datetime, bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster):
+    # One job per kind and moment: a single run sends everything due by then
+    scheduler.add_job(
+        SCHEDULE_JOBS[kind],
+        DateTrigger(run_date=run_at),
+        args=[bot, db_service, broadcaster, run_at],
+        id=f'send_{kind}_{run_at:%Y%m%d%H%M%S}',
+        replace_existing=True,
+        misfire_grace_time=None
+    )
+
+
+@timed_job('resync_schedules', "Ошибка восстановления расписания")
+async def resync_schedules_job(scheduler: AsyncIOScheduler, bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster):
+    schedules = await db_service.get_upcoming_schedules()
+    now = datetime.now().replace(microsecond=0)
+    for schedule in schedules:
+        # Overdue schedules collapse into a single catch-up run
+        run_at = max(schedule['run_at'], now)
+        schedule_delivery(scheduler, schedule['kind'], run_at, bot, db_service, broadcaster)
+    logger.info(f"Запланированных отправок восстановлено: {len(schedules)}")
+
+
+async def setup_schedule_triggers(scheduler: AsyncIOScheduler, bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster):
+    def on_schedule_changed(payload: str):
+        kind, schedule_id, run_at = payload.split(':', 2)
+        run_at = datetime.fromisoformat(run_at)
+        # Past-due schedules are sent right away by the replica that created them
+        if kind in SCHEDULE_JOBS and run_at > datetime.now():
+            schedule_delivery(scheduler, kind, run_at, bot, db_service, broadcaster)
+            logger.info(f"Запланирована отправка {kind} {schedule_id} на {run_at}")
+
+    await db_service.listen(SCHEDULE_CHANNEL, on_schedule_changed)
+    await resync_schedules_job(scheduler, bot, db_service, broadcaster)
+
+
+@timed_job('cleanup_fsm_states', "Ошибка очистки FSM-состояний")
+async def cleanup_fsm_states_job(storage: PostgresStorage):
+    async with storage.db.advisory_lock('cleanup_fsm_states') as locked:
+        if locked:
+            await storage.cleanup()
+
+
+@timed_job('send_reminders', "Ошибка отправки напоминаний")
+async def send_reminders_job(bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster):
+    wave = wave_start()
+    timezones = zones_at(await db_service.get_user_timezones(), wave, REMINDER_TIME)
+    if not timezones or not await db_service.claim_job_run('send_reminders', wave.isoformat()):
+        return
+    stats = await send_reminders(bot, db_service, broadcaster, timezones)
+    if stats:
+        logger.info(f"Напоминания отправлены ({', '.join(timezones)}): {stats.summary()}")
+
+
+def setup_scheduler(scheduler: AsyncIOScheduler, bot: Bot, db_service: AbstractDatabase, broadcaster: Broadcaster, fsm_storage: Optional[PostgresStorage] = None):
     scheduler.add_job(
         reset_daily_stats_job,
-        CronTrigger(hour=0, minute=0),
+        CronTrigger(minute=f'*/{WAVE_MINUTES}'),
         args=[db_service],
         id='reset_daily_stats',
         replace_existing=True
     )
     
     scheduler.add_job(
-        send_challenges_job,
-        CronTrigger(minute='*/5'),
-        args=[bot, db_service],
-        id='send_challenges',
-        replace_existing=True
-    )
-    
-    scheduler.add_job(
-        send_messages_job,
-        CronTrigger(minute='*/5'),
-        args=[bot, db_service],
-        id='send_messages',
+        resync_schedules_job,
+        CronTrigger(minute=f'*/{SCHEDULE_RESYNC_MINUTES}'),
+        args=[scheduler, bot, db_service, broadcaster],
+        id='resync_schedules',
         replace_existing=True
     )
     
     scheduler.add_job(
         send_reminders_job,
-        CronTrigger(hour=20, minute=0),
-        args=[bot, db_service],
+        CronTrigger(minute=f'*/{WAVE_MINUTES}'),
+        args=[bot, db_service, broadcaster],
         id='send_reminders',
         replace_existing=True
     )
 
+    if fsm_storage:
+        scheduler.add_job(
+            cleanup_fsm_states_job,
+            CronTrigger(minute=30),
+            args=[fsm_storage],
+            id='cleanup_fsm_states',
+            replace_existing=True
+        )
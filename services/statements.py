@@ -0,0 +1,347 @@
+import asyncpg
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+
+STATEMENTS: Dict[str, str] = {
+    'load_tasks': '''
+        SELECT id, title, description, points, active, created_at FROM tasks ORDER BY id
+    ''',
+    'load_links': '''
+        SELECT id, title, url, active, created_at FROM pitstop_links ORDER BY id
+    ''',
+    'update_task': '''
+        UPDATE tasks
+        SET title = COALESCE($2, title),
+            description = COALESCE($3, description),
+            points = COALESCE($4, points),
+            active = COALESCE($5, active)
+        WHERE id = $1
+    ''',
+    'update_pitstop_link': '''
+        UPDATE pitstop_links
+        SET title = COALESCE($2, title),
+            url = COALESCE($3, url)
+        WHERE id = $1
+    ''',
+    'user_session': '''
+        SELECT u.user_id, u.name, u.tandem_id, u.timezone, t.name AS tandem_name,
+               p.user_id AS partner_id, p.name AS partner_name
+        FROM users u
+        LEFT JOIN tandems t ON t.id = u.tandem_id
+        LEFT JOIN users p ON p.tandem_id = u.tandem_id AND p.user_id != u.user_id
+        WHERE u.user_id = $1
+    ''',
+    # Runs as its own statement before toggle_task: a FOR UPDATE inside the CTE would not make
+    # the DELETE/INSERT see a concurrent tap's row, they keep the statement's original snapshot
+    'lock_member': '''
+        SELECT 1 FROM users WHERE user_id = $1 FOR UPDATE
+    ''',
+    'toggle_task': '''
+        WITH task AS (
+            SELECT id, points FROM tasks WHERE id = $2 AND active = TRUE
+        ),
+        member AS (
+            SELECT COALESCE(score, 0) AS score, tandem_id FROM users WHERE user_id = $1
+        ),
+        removed AS (
+            DELETE FROM task_completions
+            WHERE user_id = $1 AND task_id = $2 AND completed_date = $3
+                AND EXISTS (SELECT 1 FROM task)
+            RETURNING task_id
+        ),
+        added AS (
+            INSERT INTO task_completions (user_id, task_id, completed_date)
+            SELECT $1, id, $3 FROM task
+            WHERE NOT EXISTS (SELECT 1 FROM removed)
+            ON CONFLICT (user_id, task_id, completed_date) DO NOTHING
+            RETURNING task_id
+        ),
+        delta AS (
+            SELECT COALESCE((SELECT points FROM task WHERE EXISTS (SELECT 1 FROM added)), 0)
+                 - COALESCE((SELECT points FROM task WHERE EXISTS (SELECT 1 FROM removed)), 0) AS points
+            WHERE EXISTS (SELECT 1 FROM added) OR EXISTS (SELECT 1 FROM removed)
+        ),
+        scored AS (
+            INSERT INTO users (user_id, score)
+            SELECT $1, d.points FROM delta d LEFT JOIN member m ON TRUE
+            ON CONFLICT (user_id) DO UPDATE SET score = GREATEST(users.score + EXCLUDED.score, 0)
+        ),
+        tandem_scored AS (
+            UPDATE tandem_scores ts
+            SET score = ts.score + GREATEST(m.score + d.points, 0) - m.score, updated_at = NOW()
+            FROM member m, delta d
+            WHERE ts.tandem_id = m.tandem_id AND GREATEST(m.score + d.points, 0) != m.score
+        ),
+        touched AS (
+            INSERT INTO daily_stats (user_id, last_updated)
+            SELECT $1, $3 FROM delta
+            ON CONFLICT (user_id) DO UPDATE SET last_updated = EXCLUDED.last_updated
+        )
+        SELECT
+            EXISTS (SELECT 1 FROM task) AS task_found,
+            EXISTS (SELECT 1 FROM added) AS completed,
+            ARRAY(
+                SELECT task_id FROM task_completions
+                WHERE user_id = $1 AND completed_date = $3
+                    AND task_id NOT IN (SELECT task_id FROM removed)
+                UNION
+                SELECT task_id FROM added
+            ) AS completed_ids
+    ''',
+    'leaderboard': '''
+        SELECT ts.tandem_id AS id, t.name, ts.score AS total_score,
+               ARRAY(SELECT u.name FROM users u WHERE u.tandem_id = ts.tandem_id ORDER BY u.user_id) AS user_names
+        FROM tandem_scores ts
+        JOIN tandems t ON t.id = ts.tandem_id
+        ORDER BY ts.score DESC, ts.tandem_id DESC
+        OFFSET $1 LIMIT $2
+    ''',
+    'leaderboard_after': '''
+        SELECT ts.tandem_id AS id, t.name, ts.score AS total_score,
+               ARRAY(SELECT u.name FROM users u WHERE u.tandem_id = ts.tandem_id ORDER BY u.user_id) AS user_names
+        FROM tandem_scores ts
+        JOIN tandems t ON t.id = ts.tandem_id
+        WHERE (ts.score, ts.tandem_id) < ($1, $2)
+        ORDER BY ts.score DESC, ts.tandem_id DESC
+        LIMIT $3
+    ''',
+    'leaderboard_before': '''
+        SELECT ts.tandem_id AS id, t.name, ts.score AS total_score,
+               ARRAY(SELECT u.name FROM users u WHERE u.tandem_id = ts.tandem_id ORDER BY u.user_id) AS user_names
+        FROM tandem_scores ts
+        JOIN tandems t ON t.id = ts.tandem_id
+        WHERE (ts.score, ts.tandem_id) > ($1, $2)
+        ORDER BY ts.score, ts.tandem_id
+        LIMIT $3
+    ''',
+    'tandem_rank': '''
+        SELECT 1 + (
+            SELECT COUNT(*) FROM tandem_scores o
+            WHERE (o.score, o.tandem_id) > (ts.score, ts.tandem_id)
+        )
+        FROM tandem_scores ts
+        WHERE ts.tandem_id = $1
+    ''',
+    'tasks_after': '''
+        SELECT id, title, active FROM tasks WHERE id > $1 ORDER BY id LIMIT $2
+    ''',
+    'tasks_before': '''
+        SELECT id, title, active FROM tasks WHERE id < $1 ORDER BY id DESC LIMIT $2
+    ''',
+    'links_after': '''
+        SELECT id, title, active FROM pitstop_links WHERE id > $1 ORDER BY id LIMIT $2
+    ''',
+    'links_before': '''
+        SELECT id, title, active FROM pitstop_links WHERE id < $1 ORDER BY id DESC LIMIT $2
+    ''',
+    'tandems_statistics': '''
+        WITH members AS (
+            SELECT user_id, tandem_id, name FROM users WHERE tandem_id = ANY($1)
+        ),
+        daily AS (
+            SELECT tandem_id, day, SUM(completions)::INTEGER AS count
+            FROM daily_completion_rollups
+            WHERE tandem_id = ANY($1) AND day >= $2
+            GROUP BY tandem_id, day
+            UNION ALL
+            SELECT m.tandem_id, tc.completed_date, COUNT(*)::INTEGER
+            FROM members m
+            JOIN task_completions tc ON tc.user_id = m.user_id
+            WHERE tc.completed_date >= $2
+                AND tc.completed_date > (SELECT COALESCE(MAX(day), $2 - 1) FROM daily_completion_rollups)
+            GROUP BY m.tandem_id, tc.completed_date
+        )
+        SELECT ts.tandem_id, ts.score AS total_score,
+               ARRAY(SELECT m.name FROM members m WHERE m.tandem_id = ts.tandem_id ORDER BY m.user_id) AS user_names,
+               ARRAY(SELECT d.day FROM daily d WHERE d.tandem_id = ts.tandem_id ORDER BY d.day) AS days,
+               ARRAY(SELECT d.count FROM daily d WHERE d.tandem_id = ts.tandem_id ORDER BY d.day) AS counts
+        FROM tandem_scores ts
+        WHERE ts.tandem_id = ANY($1)
+    ''',
+    'today_completions': '''
+        SELECT task_id FROM task_completions WHERE user_id = $1 AND completed_date = $2
+    ''',
+    'tandem_score_breakdown': '''
+        SELECT user_id, score FROM users WHERE tandem_id = $1
+    ''',
+    'users_with_incomplete_tasks': '''
+        SELECT u.user_id, u.name, u.tandem_id
+        FROM users u
+        WHERE u.tandem_id IS NOT NULL
+            AND ($3::TEXT[] IS NULL OR COALESCE(u.timezone, $2) = ANY($3))
+            AND NOT EXISTS (
+                SELECT 1 FROM task_completions tc
+                WHERE tc.user_id = u.user_id
+                    AND tc.task_id = ANY($1)
+                    AND tc.completed_date = (NOW() AT TIME ZONE COALESCE(u.timezone, $2))::DATE
+                    AND tc.completed_date BETWEEN (NOW() AT TIME ZONE 'Etc/GMT+12')::DATE
+                                              AND (NOW() AT TIME ZONE 'Etc/GMT-14')::DATE
+            )
+    ''',
+    'users_with_incomplete_tasks_page': '''
+        SELECT u.user_id
+        FROM users u
+        WHERE u.tandem_id IS NOT NULL
+            AND u.user_id > $4
+            AND ($3::TEXT[] IS NULL OR COALESCE(u.timezone, $2) = ANY($3))
+            AND NOT EXISTS (
+                SELECT 1 FROM task_completions tc
+                WHERE tc.user_id = u.user_id
+                    AND tc.task_id = ANY($1)
+                    AND tc.completed_date = (NOW() AT TIME ZONE COALESCE(u.timezone, $2))::DATE
+                    AND tc.completed_date BETWEEN (NOW() AT TIME ZONE 'Etc/GMT+12')::DATE
+                                              AND (NOW() AT TIME ZONE 'Etc/GMT-14')::DATE
+            )
+        ORDER BY u.user_id
+        LIMIT $5
+    ''',
+    'user_timezones': '''
+        SELECT DISTINCT COALESCE(timezone, $1) AS timezone FROM users
+    ''',
+    'rollover_users': '''
+        UPDATE daily_stats d
+        SET last_updated = (NOW() AT TIME ZONE COALESCE(u.timezone, $1))::DATE
+        FROM users u
+        WHERE u.user_id = d.user_id
+            AND ($2::TEXT[] IS NULL OR COALESCE(u.timezone, $1) = ANY($2))
+            AND d.last_updated < (NOW() AT TIME ZONE COALESCE(u.timezone, $1))::DATE
+    ''',
+    'claim_challenges': '''
+        WITH due AS (
+            SELECT id FROM scheduled_challenges
+            WHERE sent = FALSE AND send_time <= $1
+                AND (claimed_until IS NULL OR claimed_until < NOW())
+            ORDER BY send_time
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE scheduled_challenges s
+        SET claimed_until = NOW() + make_interval(secs => $2)
+        FROM due
+        WHERE s.id = due.id
+        RETURNING s.id, s.task_ids, s.message_text, s.send_time, s.sent, s.created_at
+    ''',
+    'claim_messages': '''
+        WITH due AS (
+            SELECT id FROM scheduled_messages
+            WHERE sent = FALSE AND scheduled_time <= $1
+                AND (claimed_until IS NULL OR claimed_until < NOW())
+            ORDER BY scheduled_time
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE scheduled_messages s
+        SET claimed_until = NOW() + make_interval(secs => $2)
+        FROM due
+        WHERE s.id = due.id
+        RETURNING s.id, s.message_type, s.scheduled_time, s.target_chat_id, s.forward_from_message_id, s.text, s.sent, s.created_at
+    ''',
+    'claim_job_run': '''
+        INSERT INTO scheduler_runs (job, run_key, instance_id)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (job, run_key) DO NOTHING
+        RETURNING TRUE
+    ''',
+    'upcoming_schedules': '''
+        SELECT 'challenge' AS kind, id, send_time AS run_at FROM scheduled_challenges WHERE sent = FALSE
+        UNION ALL
+        SELECT 'message' AS kind, id, scheduled_time AS run_at FROM scheduled_messages WHERE sent = FALSE
+        ORDER BY run_at
+    ''',
+    'broadcast_enqueue': '''
+        WITH inserted AS (
+            INSERT INTO broadcast_deliveries (broadcast_type, broadcast_id, user_id)
+            SELECT $1, $2, user_id FROM users
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM inserted) + (
+            SELECT COUNT(*) FROM broadcast_deliveries
+            WHERE broadcast_type = $1 AND broadcast_id = $2 AND status = 'pending'
+        )
+    ''',
+    'broadcast_claim': '''
+        WITH claimed AS (
+            SELECT user_id FROM broadcast_deliveries
+            WHERE broadcast_type = $1 AND broadcast_id = $2 AND status = 'pending'
+                AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => $4))
+            ORDER BY user_id
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE broadcast_deliveries d
+        SET claimed_at = NOW(), attempts = d.attempts + 1, updated_at = NOW()
+        FROM claimed
+        WHERE d.broadcast_type = $1 AND d.broadcast_id = $2 AND d.user_id = claimed.user_id
+        RETURNING d.user_id
+    ''',
+    'broadcast_record': '''
+        UPDATE broadcast_deliveries d
+        SET status = r.status, last_error = r.error, updated_at = NOW()
+        FROM unnest($3::BIGINT[], $4::TEXT[], $5::TEXT[]) AS r(user_id, status, error)
+        WHERE d.broadcast_type = $1 AND d.broadcast_id = $2 AND d.user_id = r.user_id
+    ''',
+    'fsm_get': '''
+        SELECT state, data FROM fsm_states WHERE key = $1 AND expires_at > NOW()
+    ''',
+    'fsm_set_state': '''
+        INSERT INTO fsm_states (key, state, expires_at)
+        VALUES ($1, $2, NOW() + make_interval(secs => $3))
+        ON CONFLICT (key) DO UPDATE
+        SET state = EXCLUDED.state,
+            data = CASE WHEN fsm_states.expires_at > NOW() THEN fsm_states.data END,
+            expires_at = EXCLUDED.expires_at
+    ''',
+    'fsm_set_data': '''
+        INSERT INTO fsm_states (key, data, expires_at)
+        VALUES ($1, $2, NOW() + make_interval(secs => $3))
+        ON CONFLICT (key) DO UPDATE
+        SET data = EXCLUDED.data,
+            state = CASE WHEN fsm_states.expires_at > NOW() THEN fsm_states.state END,
+            expires_at = EXCLUDED.expires_at
+    ''',
+    'fsm_clear_state': '''
+        WITH dropped AS (
+            DELETE FROM fsm_states WHERE key = $1 AND (data IS NULL OR expires_at <= NOW())
+        )
+        UPDATE fsm_states SET state = NULL, expires_at = NOW() + make_interval(secs => $2)
+        WHERE key = $1 AND data IS NOT NULL AND expires_at > NOW()
+    ''',
+    'fsm_clear_data': '''
+        WITH dropped AS (
+            DELETE FROM fsm_states WHERE key = $1 AND (state IS NULL OR expires_at <= NOW())
+        )
+        UPDATE fsm_states SET data = NULL, expires_at = NOW() + make_interval(secs => $2)
+        WHERE key = $1 AND state IS NOT NULL AND expires_at > NOW()
+    ''',
+    'fsm_cleanup': '''
+        DELETE FROM fsm_states WHERE expires_at <= NOW()
+    ''',
+}
+
+
+class PreparedConnection(asyncpg.Connection):
+    async def warm_statements(self):
+        # executemany() with no argument sets only parses the statement into the connection's statement
+        # cache. Parse/Describe leave an implicit transaction (and its table locks) open until the next
+        # Sync, so warming runs inside an explicit one; a savepoint per statement keeps a failure local.
+        async with self.transaction():
+            for name, query in STATEMENTS.items():
+                try:
+                    async with self.transaction():
+                        await self.executemany(query, [])
+                except asyncpg.PostgresError as e:
+                    logger.debug(f"Запрос {name} не подготовлен: {e}")
+
+    async def fetch_prepared(self, name: str, *args, timeout: Optional[float] = None) -> List[asyncpg.Record]:
+        return await self.fetch(STATEMENTS[name], *args, timeout=timeout)
+
+    async def fetchrow_prepared(self, name: str, *args, timeout: Optional[float] = None) -> Optional[asyncpg.Record]:
+        return await self.fetchrow(STATEMENTS[name], *args, timeout=timeout)
+
+    async def fetchval_prepared(self, name: str, *args, timeout: Optional[float] = None) -> Any:
+        return await self.fetchval(STATEMENTS[name], *args, timeout=timeout)
+
+    async def execute_prepared(self, name: str, *args, timeout: Optional[float] = None) -> str:
+        return await self.execute(STATEMENTS[name], *args, timeout=timeout)
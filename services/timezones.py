@@ -0,0 +1,65 @@
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+EARLIEST_TIMEZONE = 'Etc/GMT+12'
+LATEST_TIMEZONE = 'Etc/GMT-14'
+WAVE_MINUTES = 15
+
+_OFFSET_RE = re.compile(r'^(?:UTC|GMT)?\s*([+-])\s*(\d{1,2})$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def parse_timezone(text: str) -> Optional[str]:
+    text = text.strip()
+    if text.upper() in ('UTC', 'GMT'):
+        return 'UTC'
+
+    match = _OFFSET_RE.match(text)
+    if match:
+        sign, hours = match.group(1), int(match.group(2))
+        if hours > 14 or (sign == '-' and hours > 12):
+            return None
+        if hours == 0:
+            return 'UTC'
+        # Etc/GMT zones use inverted signs: UTC+3 is Etc/GMT-3
+        return f"Etc/GMT{'-' if sign == '+' else '+'}{hours}"
+
+    if '/' not in text:
+        return None
+    try:
+        get_zone(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+    return text
+
+
+def local_now(tz_name: str, moment: Optional[datetime] = None) -> datetime:
+    moment = moment or datetime.now(timezone.utc)
+    return moment.astimezone(get_zone(tz_name))
+
+
+def local_today(tz_name: str, moment: Optional[datetime] = None) -> date:
+    return local_now(tz_name, moment).date()
+
+
+def wave_start(moment: Optional[datetime] = None, minutes: int = WAVE_MINUTES) -> datetime:
+    moment = moment or datetime.now(timezone.utc)
+    return moment.replace(minute=moment.minute - moment.minute % minutes, second=0, microsecond=0)
+
+
+def zones_at(zones: Iterable[str], moment: datetime, at: time, minutes: int = WAVE_MINUTES) -> List[str]:
+    due = []
+    for tz_name in zones:
+        local = local_now(tz_name, moment)
+        start = local.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+        if start <= local < start + timedelta(minutes=minutes):
+            due.append(tz_name)
+    return due
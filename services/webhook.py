@@ -0,0 +1,120 @@
+import asyncio
+import hmac
+import signal
+from contextlib import suppress
+from typing import Any, List
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from loguru import logger
+from pydantic import ValidationError
+
+from config.config import WebhookConfig
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str, max_concurrency: int = 64, queue_size: int = 1000, **kwargs: Any):
+        if not secret:
+            raise ValueError("Webhook: секрет не задан")
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.max_concurrency = max_concurrency
+        self.kwargs = {'dispatcher': dp, 'bots': [bot], **kwargs}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+
+    def register(self, app: web.Application, path: str):
+        app.router.add_post(path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            logger.warning(f"Webhook: запрос с неверным секретом от {request.remote}")
+            return web.Response(status=401)
+        # Telegram redelivers on 5xx, so a burst waits on its side instead of piling up in memory here
+        if self._queue.full():
+            return self._overloaded()
+
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        except (ValueError, ValidationError) as e:
+            logger.warning(f"Webhook: некорректный апдейт: {e}")
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return self._overloaded()
+        return web.Response()
+
+    def _overloaded(self) -> web.Response:
+        logger.warning(f"Webhook: очередь заполнена ({self._queue.maxsize}), апдейт отклонён")
+        return web.Response(status=503, headers={'Retry-After': '1'})
+
+    async def _work(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update, **self.kwargs)
+            except Exception as e:
+                logger.exception(f"Webhook: ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        if self._queue.qsize():
+            logger.info(f"Webhook: ожидание {self._queue.qsize()} необработанных апдейтов")
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    server = WebhookServer(
+        dp, bot, secret=config.secret, max_concurrency=config.max_concurrency, queue_size=config.queue_size
+    )
+    app = web.Application()
+    server.register(app, config.path)
+    runner = web.AppRunner(app, access_log=None)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    workflow_data = {**dp.workflow_data, **server.kwargs}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        server.start()
+        await runner.setup()
+        await web.TCPSite(runner, config.host, config.port).start()
+        logger.info(f"Webhook слушает {config.host}:{config.port}{config.path}")
+
+        if config.url:
+            await bot.set_webhook(
+                config.url,
+                secret_token=config.secret,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=min(config.max_concurrency, 100),
+            )
+            logger.info(f"Webhook зарегистрирован: {config.url}")
+        else:
+            logger.info("WEBHOOK_BASE_URL не задан, webhook в Telegram не регистрируется")
+
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await server.close()
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
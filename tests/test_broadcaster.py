@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from services.broadcaster import DELIVERY_SENT, Broadcaster
+
+
+def test_run_delivers_every_recipient():
+    async def scenario():
+        delivered, results = [], []
+
+        async def deliver(user_id: int):
+            delivered.append(user_id)
+
+        stats = await Broadcaster(rate=1000.0, workers=4).run(
+            'test', range(50), deliver, on_result=lambda user_id, status, error: results.append(status)
+        )
+        return stats, delivered, results
+
+    stats, delivered, results = asyncio.run(scenario())
+    assert sorted(delivered) == list(range(50))
+    assert stats.sent == stats.processed == 50
+    assert results == [DELIVERY_SENT] * 50
+
+
+def test_failing_result_callback_stops_all_workers():
+    async def scenario():
+        delivered = []
+
+        async def deliver(user_id: int):
+            delivered.append(user_id)
+            await asyncio.sleep(0.001)
+
+        async def on_result(user_id: int, status: str, error):
+            if user_id == 10:
+                raise ConnectionError('ledger недоступен')
+
+        with pytest.raises(ConnectionError):
+            await Broadcaster(rate=1000.0, workers=8).run('test', range(10_000), deliver, on_result=on_result)
+        stopped_at = len(delivered)
+        await asyncio.sleep(0.1)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        return stopped_at, len(delivered)
+
+    stopped_at, later = asyncio.run(scenario())
+    assert stopped_at == later
+    assert later < 100
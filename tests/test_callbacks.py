@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update
+
+from handlers.dispatch import CallbackTable
+from handlers.fallback import on_stale_callback
+
+from keyboards.callbacks import (
+    CALLBACK_LIMIT, DELETE_ME, LEADERBOARD_PAGE, TANDEM_NAME, TASK_VIEW, TRACKER_CHECK, TRACKER_CLOSE, TRACKER_SINGLE,
+    decode_fields, encode_fields, pack, unpack
+)
+from keyboards.pagination import page_callback, parse_page_fields
+from services.message_dealer import MessageDealer
+
+
+@pytest.mark.parametrize('fields', [(), (0,), (35, 36), (2 ** 31 - 1, 2 ** 63 - 1), (-5, 7)])
+def test_fields_round_trip(fields):
+    assert decode_fields(encode_fields(fields)) == fields
+
+
+def test_pack_is_base36():
+    assert pack(TASK_VIEW, 48) == 'v1c'
+    assert unpack('v1c') == (TASK_VIEW, (48,))
+
+
+def test_pack_rejects_oversized_data():
+    with pytest.raises(ValueError):
+        pack(TASK_VIEW, *range(2 ** 40, 2 ** 40 + CALLBACK_LIMIT))
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('task_12_check', (TRACKER_CHECK, (12,))),
+    ('task_12_single', (TRACKER_SINGLE, (12,))),
+    ('type_tandem_name', (TANDEM_NAME, ())),
+    ('check_check', (TRACKER_CLOSE, ())),
+    ('delete_me', (DELETE_ME, ())),
+])
+def test_unpack_legacy(data, expected):
+    assert unpack(data) == expected
+
+
+@pytest.mark.parametrize('data', [None, '', 'admin_tasks', 'task_view_5', 'tpg:3:1', 'v1.!'])
+def test_unpack_unroutable(data):
+    assert unpack(data) is None
+
+
+@pytest.mark.parametrize('backward', [False, True])
+def test_page_cursor_round_trip(backward):
+    cursor = (2 ** 31 - 1, 2 ** 31 - 1)
+    prefix, fields = unpack(page_callback(LEADERBOARD_PAGE, backward, cursor))
+    assert prefix == LEADERBOARD_PAGE
+    assert parse_page_fields(fields) == (backward, cursor)
+
+
+def test_page_without_cursor():
+    assert parse_page_fields(()) == (False, None)
+    assert parse_page_fields((1,)) == (True, None)
+
+
+@pytest.mark.parametrize('data, expected', [('v1c', 'task 48'), ('v', 'stale'), ('admin_tasks', 'stale'), ('tpg:3:1', 'stale')])
+def test_table_and_fallback_answers(data, expected):
+    md = MessageDealer()
+    answers = []
+
+    async def answer(self, text=None, **kwargs):
+        answers.append(text)
+
+    async def scenario():
+        router = Router()
+        table = CallbackTable(router)
+
+        @table(TASK_VIEW, 'task_id')
+        async def on_view(call, task_id: int):
+            await call.answer(f'task {task_id}')
+
+        fallback = Router()
+        fallback.callback_query.register(on_stale_callback)
+        dp = Dispatcher(md=md)
+        dp.include_routers(router, fallback)
+        bot = Bot('1:test')
+        update = Update.model_validate({'update_id': 1, 'callback_query': {
+            'id': '1', 'chat_instance': '1', 'data': data, 'from': {'id': 1, 'is_bot': False, 'first_name': 'Test'},
+        }})
+        with patch('aiogram.types.CallbackQuery.answer', answer):
+            await dp.feed_update(bot, update)
+        await bot.session.close()
+
+    asyncio.run(scenario())
+    assert answers == [md.get_error('stale_button') if expected == 'stale' else expected]
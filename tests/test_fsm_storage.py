@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from services.fsm_storage import PostgresStorage, decode_data, encode_data
+
+
+@pytest.mark.parametrize('data', [{}, None])
+def test_empty_data_is_not_stored(data):
+    assert encode_data(data) is None
+    assert decode_data(None) == {}
+    assert decode_data(b'') == {}
+
+
+def test_small_data_stays_plain():
+    data = {'name': 'Тандем', 'task_ids': [1, 2, 3]}
+    blob = encode_data(data)
+    assert blob.startswith(b'j')
+    assert decode_data(blob) == data
+
+
+def test_large_data_is_compressed():
+    data = {'text': 'повтор ' * 200}
+    blob = encode_data(data)
+    assert blob.startswith(b'z')
+    assert len(blob) < len('повтор ' * 200)
+    assert decode_data(blob) == data
+
+
+def test_incompressible_data_stays_plain():
+    # zlib framing outweighs any saving on a payload this short
+    data = {'k': 'abcdefghij'}
+    blob = encode_data(data, compress_threshold=16)
+    assert blob.startswith(b'j')
+    assert decode_data(blob) == data
+
+
+def test_decode_accepts_memoryview():
+    data = {'step': 2}
+    assert decode_data(memoryview(encode_data(data))) == data
+
+
+class _FakeConnection:
+    def __init__(self, blob: bytes):
+        self.blob = blob
+        self.fetches = 0
+
+    async def fetchrow_prepared(self, name: str, key: str):
+        self.fetches += 1
+        return {'state': 'Wizard:tasks', 'data': self.blob}
+
+
+class _FakePool:
+    def __init__(self, conn: _FakeConnection):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def test_get_data_does_not_share_nested_values_with_the_cache():
+    conn = _FakeConnection(encode_data({'tasks': [{'id': 1}]}))
+    storage = PostgresStorage(SimpleNamespace(pool=_FakePool(conn)))
+    key = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+    async def scenario():
+        token = storage.begin_update()
+        try:
+            data = await storage.get_data(key)
+            data['tasks'].append({'id': 2})
+            data['tasks'][0]['id'] = 5
+            return await storage.get_data(key)
+        finally:
+            storage.end_update(token)
+
+    assert asyncio.run(scenario()) == {'tasks': [{'id': 1}]}
+    assert conn.fetches == 1
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+import pytest
+
+from services.database import PostgresService
+from services.statements import STATEMENTS
+
+DSN = os.environ.get('TANDEM_TEST_DSN')
+MEMBERS_INDEX = 'idx_users_tandem_members'
+
+_spec = importlib.util.spec_from_file_location('bench_db', Path(__file__).resolve().parent.parent / 'scripts' / 'bench_db.py')
+bench_db = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_db)
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def test_seq_scans_walks_nested_plans():
+    plan = {'Node Type': 'Hash Join', 'Plans': [
+        {'Node Type': 'Seq Scan', 'Relation Name': 'users'},
+        {'Node Type': 'Hash', 'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'tasks'}]},
+        {'Node Type': 'Index Only Scan', 'Relation Name': 'users', 'Index Name': MEMBERS_INDEX},
+    ]}
+    assert list(bench_db.seq_scans(plan)) == ['users', 'tasks']
+
+
+def test_plan_check_covers_known_statements():
+    checked = bench_db.plan_args(argparse.Namespace(tandems=20), [1, 2], 'Europe/Moscow')
+    assert set(checked) <= set(STATEMENTS)
+    # An allow-listed full scan must name a statement the check actually runs
+    assert set(bench_db.FULL_SCANS) <= set(checked)
+
+
+@pytest.mark.skipif(not DSN, reason='TANDEM_TEST_DSN не задан')
+@pytest.mark.parametrize('name, params', [
+    ('user_session', (1,)),
+    ('leaderboard', (0, 20)),
+    ('tandem_score_breakdown', (1,)),
+])
+def test_member_lookups_use_covering_index(name, params):
+    async def scenario():
+        db = PostgresService(DSN)
+        await db.migrate()
+        await db.connect()
+        try:
+            async with db.pool.acquire() as conn, conn.transaction():
+                # Test tables are tiny; forbid seq scans so the plan shows whether the index can serve the lookup
+                await conn.execute('SET LOCAL enable_seqscan = off')
+                plan = json.loads(await conn.fetchval(f'EXPLAIN (FORMAT JSON) {STATEMENTS[name]}', *params))[0]['Plan']
+        finally:
+            await db.disconnect()
+        return {node.get('Index Name') for node in _plan_nodes(plan) if node.get('Relation Name') == 'users'}
+
+    assert MEMBERS_INDEX in asyncio.run(scenario())
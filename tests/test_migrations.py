@@ -0,0 +1,36 @@
+import pytest
+
+from services.migrations import MIGRATIONS_DIR, load_migrations
+
+
+def test_shipped_migrations_load():
+    migrations = load_migrations(MIGRATIONS_DIR)
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    assert str(migrations[0]) == '0001_initial'
+
+
+def test_migrations_are_ordered(tmp_path):
+    (tmp_path / '0002_add_index.sql').write_text('CREATE INDEX i ON t(c);', encoding='utf-8')
+    (tmp_path / '0001_initial.sql').write_text('CREATE TABLE t (c INTEGER);', encoding='utf-8')
+    migrations = load_migrations(tmp_path)
+    assert [str(migration) for migration in migrations] == ['0001_initial', '0002_add_index']
+    assert migrations[1].sql == 'CREATE INDEX i ON t(c);'
+
+
+def test_empty_directory(tmp_path):
+    assert load_migrations(tmp_path) == []
+
+
+@pytest.mark.parametrize('name', ['1_initial.sql', '0001-initial.sql', '0001_.sql'])
+def test_bad_file_name(tmp_path, name):
+    (tmp_path / name).write_text('', encoding='utf-8')
+    with pytest.raises(ValueError, match='имя файла'):
+        load_migrations(tmp_path)
+
+
+@pytest.mark.parametrize('names', [['0001_a.sql', '0003_c.sql'], ['0002_b.sql'], ['0001_a.sql', '0001_b.sql']])
+def test_gap_or_duplicate(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_text('', encoding='utf-8')
+    with pytest.raises(ValueError, match='подряд'):
+        load_migrations(tmp_path)
@@ -0,0 +1,66 @@
+import asyncio
+import os
+from datetime import datetime, time, timezone
+
+import pytest
+
+from services.database import PostgresService
+from services.timezones import local_today, parse_timezone, wave_start, zones_at
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Europe/Moscow', 'Europe/Moscow'),
+    ('  Asia/Tokyo ', 'Asia/Tokyo'),
+    ('+3', 'Etc/GMT-3'),
+    ('UTC+3', 'Etc/GMT-3'),
+    ('gmt -5', 'Etc/GMT+5'),
+    ('+14', 'Etc/GMT-14'),
+    ('-12', 'Etc/GMT+12'),
+    ('+0', 'UTC'),
+    ('utc', 'UTC'),
+])
+def test_parse_timezone(text, expected):
+    assert parse_timezone(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'Moscow', 'Mars/Olympus', '+15', '-13', '3', '../etc/passwd', 'Europe/'])
+def test_parse_timezone_rejects(text):
+    assert parse_timezone(text) is None
+
+
+def test_local_today_crosses_midnight():
+    moment = datetime(2026, 1, 1, 22, 30, tzinfo=timezone.utc)
+    assert local_today('Europe/Moscow', moment).isoformat() == '2026-01-02'
+    assert local_today('Etc/GMT+12', moment).isoformat() == '2026-01-01'
+
+
+def test_zones_at_picks_zones_in_the_wave():
+    moment = wave_start(datetime(2026, 1, 1, 17, 7, tzinfo=timezone.utc))
+    assert moment == datetime(2026, 1, 1, 17, 0, tzinfo=timezone.utc)
+    assert zones_at(['Europe/Moscow', 'UTC', 'Etc/GMT-3'], moment, time(20, 0)) == ['Europe/Moscow', 'Etc/GMT-3']
+
+
+@pytest.mark.skipif(not os.environ.get('TANDEM_TEST_DSN'), reason='TANDEM_TEST_DSN не задан')
+def test_user_timezones_are_cached_until_a_session_change():
+    user_id = 9_000_000_002
+
+    async def scenario():
+        db = PostgresService(os.environ['TANDEM_TEST_DSN'])
+        await db.migrate()
+        await db.connect()
+        try:
+            await db.set_user_timezone(user_id, 'Asia/Tokyo')
+            assert 'Asia/Tokyo' in await db.get_user_timezones()
+            assert db.default_timezone in await db.get_user_timezones()
+            async with db.pool.acquire() as conn:
+                # Behind the service's back: no NOTIFY, so the cached set is still served
+                await conn.execute("UPDATE users SET timezone = 'Asia/Kolkata' WHERE user_id = $1", user_id)
+            assert 'Asia/Kolkata' not in await db.get_user_timezones()
+            await db.set_user_timezone(user_id, 'America/Denver')
+            assert 'America/Denver' in await db.get_user_timezones()
+        finally:
+            async with db.pool.acquire() as conn:
+                await conn.execute('DELETE FROM users WHERE user_id = $1', user_id)
+            await db.disconnect()
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+import pytest
+
+from services.database import PostgresService
+from services.timezones import local_today
+
+DSN = os.environ.get('TANDEM_TEST_DSN')
+USER_ID = 9_000_000_001
+
+pytestmark = pytest.mark.skipif(not DSN, reason='TANDEM_TEST_DSN не задан')
+
+
+async def _with_service(scenario):
+    db = PostgresService(DSN)
+    await db.migrate()
+    await db.connect()
+    task_id = await db.create_task('Тест конкурентных нажатий', '', 3)
+    try:
+        await db.register_user(USER_ID)
+        return await scenario(db, task_id)
+    finally:
+        async with db.pool.acquire() as conn:
+            await conn.execute('DELETE FROM tasks WHERE id = $1', task_id)
+            await conn.execute('DELETE FROM users WHERE user_id = $1', USER_ID)
+        await db.disconnect()
+
+
+async def _stored_ids(db: PostgresService, today) -> set:
+    async with db.pool.acquire() as conn:
+        rows = await conn.fetch(
+            'SELECT task_id FROM task_completions WHERE user_id = $1 AND completed_date = $2', USER_ID, today
+        )
+    return {row['task_id'] for row in rows}
+
+
+def test_second_tap_sees_uncommitted_first_tap():
+    async def scenario(db: PostgresService, task_id: int):
+        today = local_today(await db.get_user_timezone(USER_ID))
+        async with db.pool.acquire() as conn:
+            # First tap: same statements as toggle_task_with_state, held open until the second tap is waiting
+            transaction = conn.transaction()
+            await transaction.start()
+            await conn.execute_prepared('lock_member', USER_ID)
+            first = await conn.fetchrow_prepared('toggle_task', USER_ID, task_id, today)
+            second = asyncio.create_task(db.toggle_task_with_state(USER_ID, task_id))
+            await asyncio.sleep(0.3)
+            assert not second.done()
+            await transaction.commit()
+        completed, completed_ids = await second
+
+        assert first['completed'] is True
+        assert completed is False
+        assert task_id not in completed_ids
+        assert task_id not in await _stored_ids(db, today)
+        assert (await db.get_user_info(USER_ID))['score'] == 0
+
+    asyncio.run(_with_service(scenario))
+
+
+def test_concurrent_taps_match_stored_state():
+    async def scenario(db: PostgresService, task_id: int):
+        today = local_today(await db.get_user_timezone(USER_ID))
+        skipped = db.skipped_upserts
+        for taps in (2, 3, 4):
+            results = await asyncio.gather(*(db.toggle_task_with_state(USER_ID, task_id) for _ in range(taps)))
+            # Serialised taps alternate, so exactly half of them (rounded up) check the task
+            assert sum(completed for completed, _ in results) == (taps + 1) // 2
+            stored = task_id in await _stored_ids(db, today)
+            assert stored == bool(taps % 2)
+            if stored:
+                await db.toggle_task_with_state(USER_ID, task_id)
+        assert (await db.get_user_info(USER_ID))['score'] == 0
+        # Every toggle replaces the users/daily_stats existence upserts the old path ran
+        assert db.skipped_upserts - skipped == 2 * (2 + 3 + 4 + 1)
+
+    asyncio.run(_with_service(scenario))
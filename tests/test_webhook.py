@@ -0,0 +1,53 @@
+import asyncio
+
+import aiohttp
+from aiogram import Bot
+from aiohttp import web
+
+from services.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = 'test-secret'
+
+
+class BlockingDispatcher:
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.processed = []
+
+    async def feed_update(self, bot, update, **kwargs):
+        await self.release.wait()
+        self.processed.append(update.update_id)
+
+
+def test_full_queue_answers_503_and_drains_on_close():
+    async def scenario():
+        dp = BlockingDispatcher()
+        bot = Bot('1:test')
+        server = WebhookServer(dp, bot, secret=SECRET, max_concurrency=1, queue_size=2)
+        app = web.Application()
+        server.register(app, '/webhook')
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+        server.start()
+
+        statuses = []
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json={'update_id': 1}, headers={SECRET_HEADER: 'wrong'}) as response:
+                statuses.append(response.status)
+            for update_id in range(1, 5):
+                async with session.post(url, json={'update_id': update_id}, headers={SECRET_HEADER: SECRET}) as response:
+                    statuses.append(response.status)
+                # Let the only worker pick up the first update before the queue fills
+                await asyncio.sleep(0.05)
+        await runner.cleanup()
+        dp.release.set()
+        await server.close()
+        await bot.session.close()
+        return statuses, dp.processed
+
+    statuses, processed = asyncio.run(scenario())
+    assert statuses == [401, 200, 200, 200, 503]
+    assert processed == [1, 2, 3]